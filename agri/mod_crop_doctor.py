@@ -2,18 +2,32 @@ import torch
 from torchvision import models, transforms
 from PIL import Image
 import os
+from utility.mod_micro_batch import MicroBatcher
+from utility import mod_model_export
+from utility.mod_thread_budget import budget
 
 class CropDoctor:
-    def __init__(self, use_optimized_model=True):
+    def __init__(self, use_optimized_model=True, runtime="eager"):
+        """
+        runtime: "eager" (fp32 PyTorch), or "int8" / "torchscript" / "onnx" to load
+        an artifact built by 'python -m utility.mod_model_export build'.
+        """
         print("[Vision] Initializing Crop Doctor...")
+        budget.apply_torch()
         
         # 1. Load Model Architecture
         # MobileNetV3 is ~5MB (Fast). ResNet50 is ~100MB (Slow).
         # We use MobileNet to respect the "Low-End Phone" constraint.
-        if use_optimized_model:
-            self.model = models.mobilenet_v3_large(weights=models.MobileNet_V3_Large_Weights.DEFAULT)
-        else:
-            self.model = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
+        arch = "mobilenet_v3" if use_optimized_model else "resnet50"
+        self.runtime = runtime
+        self.model = mod_model_export.load_exported(f"crop_doctor_{arch}", runtime)
+
+        if self.model is None:
+            self.runtime = "eager"
+            if use_optimized_model:
+                self.model = models.mobilenet_v3_large(weights=models.MobileNet_V3_Large_Weights.DEFAULT)
+            else:
+                self.model = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
             
         self.model.eval() # Inference Mode
         
@@ -31,24 +45,95 @@ class CropDoctor:
         # You would fine-tune this on a 'PlantVillage' dataset.
         with open("imagenet_classes.txt", "r") as f:
             self.labels = [line.strip() for line in f.readlines()]
+
+        # Micro-batching queue (see enable_batching)
+        self.batcher = None
             
-        print("[Vision] Model Loaded on CPU.")
+        print(f"[Vision] Model Loaded on CPU ({self.runtime}).")
+
+    def _load_tensor(self, image_path):
+        """Reads one photo and returns its (3, 224, 224) tensor, or None if missing."""
+        if not os.path.exists(image_path):
+            return None
+        input_image = Image.open(image_path).convert('RGB')
+        return self.preprocess(input_image)
+
+    def _infer_batch(self, tensors):
+        """Runs a list of preprocessed tensors as one batch. Returns [(label, confidence), ...]."""
+        input_batch = torch.stack(tensors)
+
+        with torch.no_grad():
+            output = self.model(input_batch)
+
+        # Top prediction for every row at once
+        probabilities = torch.nn.functional.softmax(output, dim=1)
+        top_prob, top_id = probabilities.max(dim=1)
+        return [(self.labels[i], p) for i, p in zip(top_id.tolist(), top_prob.tolist())]
 
     def diagnose(self, image_path):
         """
         Diagnoses the disease from an image file.
         """
-        if not os.path.exists(image_path):
+        input_tensor = self._load_tensor(image_path)
+        if input_tensor is None:
             return "Error: Image not found."
 
-        # Load and Preprocess
-        input_image = Image.open(image_path).convert('RGB')
-        input_tensor = self.preprocess(input_image)
-        input_batch = input_tensor.unsqueeze(0) # Create mini-batch
-
         # Inference (No GPU needed for single image)
-        with torch.no_grad():
-            output = self.model(input_batch)
-            
-        # Get Top Prediction
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
\ No newline at end of file
+        return self._infer_batch([input_tensor])[0]
+
+    def diagnose_batch(self, image_paths):
+        """
+        Diagnoses many photos in one forward pass.
+        Returns one entry per path: (label, confidence) or an error string.
+        """
+        tensors = [self._load_tensor(p) for p in image_paths]
+        found = [t for t in tensors if t is not None]
+        results = iter(self._infer_batch(found)) if found else iter([])
+        return [next(results) if t is not None else "Error: Image not found." for t in tensors]
+
+    def enable_batching(self, max_batch_size=16, max_wait_ms=10):
+        """
+        Starts the micro-batching queue. Concurrent diagnose_queued() calls
+        arriving within max_wait_ms are run together as one tensor batch.
+        """
+        if self.batcher is None:
+            self.batcher = MicroBatcher(self._infer_batch, max_batch_size=max_batch_size,
+                                        max_wait_ms=max_wait_ms, name="CropBatcher")
+        return self.batcher
+
+    def diagnose_queued(self, image_path, timeout=30):
+        """
+        Same result as diagnose(), but shares the forward pass with other
+        requests in flight. Image decoding stays on the caller's thread.
+        """
+        input_tensor = self._load_tensor(image_path)
+        if input_tensor is None:
+            return "Error: Image not found."
+        if self.batcher is None:
+            self.enable_batching()
+        return self.batcher.run(input_tensor, timeout=timeout)
+
+    def close(self):
+        """Stops the batching thread (ModelHub calls this on eviction); it holds a reference to the model."""
+        if self.batcher is not None:
+            self.batcher.close()
+            self.batcher = None
+
+# --- Test Block ---
+if __name__ == "__main__":
+    import sys
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    doc = CropDoctor()
+    photos = sys.argv[1:]
+    if photos:
+        print(doc.diagnose_batch(photos))
+
+        # Simulate a cooperative uploading everything at once
+        doc.enable_batching(max_batch_size=16, max_wait_ms=10)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(doc.diagnose_queued, photos * 4))
+        elapsed = time.perf_counter() - start
+        print(f"[Vision] {len(photos) * 4} photos in {elapsed:.2f}s. {doc.batcher.stats()}")
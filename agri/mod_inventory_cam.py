@@ -1,6 +1,17 @@
 from ultralytics import YOLO
 import cv2
+import os
+import csv
+import json
+import time
 import logging
+import numpy as np
+import torch
+from torchvision.ops import batched_nms
+from utility.mod_thread_budget import budget
+from agri.mod_object_tracker import ObjectTracker
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
 
 # Reduce YOLO logging noise
 logging.getLogger("ultralytics").setLevel(logging.ERROR)
@@ -8,35 +19,277 @@ logging.getLogger("ultralytics").setLevel(logging.ERROR)
 class InventoryCam:
     def __init__(self):
         print("[Vision] Loading YOLOv8-Nano (Edge Optimized)...")
+        budget.apply_torch()
+        budget.apply_opencv()
         # Downloads 'yolov8n.pt' automatically on first run (6.2 MB)
         self.model = YOLO('yolov8n.pt') 
 
+    def _class_counts(self, result):
+        """{class name: count} for one YOLO result, from a bincount over boxes.cls (no per-box loop)."""
+        counts = torch.bincount(result.boxes.cls.long(), minlength=len(self.model.names))
+        return {self.model.names[i]: int(counts[i]) for i in torch.nonzero(counts).flatten().tolist()}
+
+    def _target_count(self, counts, target_class):
+        # If target_class is 'all', count everything.
+        return sum(counts.values()) if target_class == "all" else counts.get(target_class, 0)
+
     def count_stock(self, image_path, target_class="orange"):
         """
         Detects objects and counts instances of a specific class.
+        image_path may also be a BGR array (e.g. a camera frame).
         """
         # Run inference
-        results = self.model(image_path)
+        results = self.model(image_path, verbose=False)
         
-        count = 0
-        detected_items = []
-        
-        # Parse results
+        counts = {}
         for r in results:
-            for box in r.boxes:
-                # Get Class ID and Name
-                cls_id = int(box.cls[0])
-                class_name = self.model.names[cls_id]
-                
-                detected_items.append(class_name)
-                
-                # Filter for the specific item (e.g., counting only 'oranges')
-                # If target_class is 'all', count everything.
-                if target_class == "all" or class_name == target_class:
-                    count += 1
-
-        print(f"[Vision] Detected: {detected_items}")
-        return count
+            for name, n in self._class_counts(r).items():
+                counts[name] = counts.get(name, 0) + n
+
+        print(f"[Vision] Detected: {counts}")
+        return self._target_count(counts, target_class)
+
+    def _image_paths(self, images):
+        """A directory (its images, sorted), one image path, or a list of paths."""
+        if isinstance(images, str) and os.path.isdir(images):
+            return [os.path.join(images, name) for name in sorted(os.listdir(images))
+                    if name.lower().endswith(IMAGE_EXTENSIONS)]
+        return [images] if isinstance(images, str) else list(images)
+
+    def count_batch(self, images, target_class="all", batch_size=16, conf=0.25):
+        """
+        Counts stock in many photos (directory or list of paths), running YOLO
+        on batch_size images per forward pass. Yields, per image and in order,
+        as soon as its batch is done: {"image", "counts" {class: n}, "total",
+        "target"}. An image that can't be decoded gets {"image", "error"}.
+        """
+        paths = self._image_paths(images)
+        for start in range(0, len(paths), batch_size):
+            chunk = paths[start:start + batch_size]
+            # Decoded here, so every result is tied to its own path even when a file is corrupt
+            frames = [cv2.imread(path) for path in chunk]
+            readable = [frame for frame in frames if frame is not None]
+            results = iter(self.model.predict(readable, batch=len(readable), conf=conf, verbose=False) if readable else [])
+            for path, frame in zip(chunk, frames):
+                if frame is None:
+                    print(f"[Vision] Could not read '{path}'.")
+                    yield {"image": path, "error": "Could not read image"}
+                    continue
+                counts = self._class_counts(next(results))
+                yield {
+                    "image": path,
+                    "counts": counts,
+                    "total": sum(counts.values()),
+                    "target": self._target_count(counts, target_class),
+                }
+
+    def audit(self, images, out_path="inventory_audit.csv", target_class="all", batch_size=16, conf=0.25):
+        """
+        Nightly audit: count_batch over a directory/list, written row by row to
+        out_path (.csv: image,class,count per detected class, "image,,0" when
+        nothing was found and "image,," when it couldn't be read; .jsonl: one
+        object per image). Returns totals and images/sec.
+        """
+        start = time.perf_counter()
+        totals = {}
+        n_images = 0
+        unreadable = []
+        jsonl = out_path.lower().endswith(".jsonl")
+        with open(out_path, "w", newline="", encoding="utf-8") as f:
+            writer = None if jsonl else csv.writer(f)
+            if writer:
+                writer.writerow(["image", "class", "count"])
+            for row in self.count_batch(images, target_class, batch_size, conf):
+                if "error" in row:
+                    unreadable.append(row["image"])
+                else:
+                    n_images += 1
+                    for name, n in row["counts"].items():
+                        totals[name] = totals.get(name, 0) + n
+                if jsonl:
+                    f.write(json.dumps(row) + "\n")
+                elif "error" in row:
+                    writer.writerow([row["image"], "", ""])
+                elif row["counts"]:
+                    writer.writerows([row["image"], name, n] for name, n in row["counts"].items())
+                else:
+                    writer.writerow([row["image"], "", 0])
+        elapsed = time.perf_counter() - start
+        summary = {
+            "images": n_images,
+            "seconds": round(elapsed, 2),
+            "images_per_s": round(n_images / elapsed, 2) if elapsed else 0.0,
+            "totals": totals,
+            "target": self._target_count(totals, target_class),
+            "unreadable": unreadable,
+            "output": out_path,
+        }
+        print(f"[Vision] Audited {n_images} images in {summary['seconds']}s ({summary['images_per_s']} images/s) -> {out_path}")
+        return summary
+
+    def _tile_grid(self, w, h, tile, overlap):
+        """Top-left corners of tile x tile crops covering the image, neighbours overlapping by 'overlap'."""
+        tw, th = min(tile, w), min(tile, h)
+        step_x, step_y = max(1, int(tw * (1 - overlap))), max(1, int(th * (1 - overlap)))
+        xs = list(range(0, w - tw + 1, step_x))
+        ys = list(range(0, h - th + 1, step_y))
+        if xs[-1] + tw < w:
+            xs.append(w - tw)
+        if ys[-1] + th < h:
+            ys.append(h - th)
+        return np.array([(x, y, x + tw, y + th) for y in ys for x in xs], dtype=np.int64)
+
+    def _busy_tiles(self, img, tiles, min_std=8.0, min_edges=0.01, shrink=4):
+        """
+        Cheap pre-check before YOLO: a tile of plain wall/floor (low grey-level
+        spread and almost no edges) can't hold stock. Works on a 1/shrink copy
+        with integral images, so every tile costs O(1).
+        """
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, None, fx=1 / shrink, fy=1 / shrink, interpolation=cv2.INTER_AREA)
+        total, squares = cv2.integral2(small, sdepth=cv2.CV_64F)
+        edges = cv2.integral((cv2.Canny(small, 50, 150) > 0).astype(np.uint8))
+        x0, y0 = tiles[:, 0] // shrink, tiles[:, 1] // shrink
+        x1 = np.maximum(tiles[:, 2] // shrink, x0 + 1)
+        y1 = np.maximum(tiles[:, 3] // shrink, y0 + 1)
+
+        def box_sum(table):
+            return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]
+
+        n = (x1 - x0) * (y1 - y0)
+        mean = box_sum(total) / n
+        std = np.sqrt(np.maximum(box_sum(squares) / n - mean ** 2, 0))
+        return (std >= min_std) | (box_sum(edges) / n >= min_edges)
+
+    @staticmethod
+    def _inside(a, b):
+        """[i, j]: share of box a[i]'s area lying inside box b[j]."""
+        lt = torch.maximum(a[:, None, :2], b[None, :, :2])
+        rb = torch.minimum(a[:, None, 2:], b[None, :, 2:])
+        inter = (rb - lt).clamp(min=0).prod(dim=2)
+        area = (a[:, 2:] - a[:, :2]).prod(dim=1)
+        return inter / area[:, None].clamp(min=1e-6)
+
+    def _merge_tiles(self, boxes, scores, classes, iou=0.5, containment=0.8):
+        """
+        Cross-tile merge: class-aware NMS (torchvision batched_nms), then drop
+        boxes lying mostly (>= containment of their area) inside a stronger
+        box of the same class: the cut-off half of an object on a tile edge.
+        """
+        keep = batched_nms(boxes, scores, classes, iou)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]  # Sorted by score
+        if len(boxes) > 1:
+            inside = self._inside(boxes, boxes)
+            stronger = torch.ones_like(inside, dtype=torch.bool).triu(diagonal=1).T  # j ranks above i
+            same = classes[:, None] == classes[None, :]
+            drop = ((inside >= containment) & stronger & same).any(dim=1)
+            boxes, scores, classes = boxes[~drop], scores[~drop], classes[~drop]
+        return boxes, scores, classes
+
+    def _seam_pieces(self, boxes, classes, cut, overview, overview_classes, containment=0.8):
+        """
+        Mask of tile boxes that are pieces of one bigger object: cut by a tile
+        seam and lying mostly inside a same-class box of the full-frame pass.
+        Side-by-side halves escape NMS and the containment rule, so without
+        this a sack larger than a tile is counted once per tile.
+        """
+        if not len(boxes) or not len(overview):
+            return torch.zeros(len(boxes), dtype=torch.bool)
+        same = classes[:, None] == overview_classes[None, :]
+        return cut & ((self._inside(boxes, overview) >= containment) & same).any(dim=1)
+
+    def count_tiled(self, image, target_class="all", tile=640, overlap=0.2, conf=0.25, iou=0.5, overview=True):
+        """
+        Counts small items in a high-resolution photo (path or BGR array).
+        Instead of shrinking the whole shot to 640 px (small sacks vanish) the
+        image is cut into overlapping tile x tile crops at full resolution.
+        Blank tiles are skipped, the rest run through YOLO in a single batched
+        forward pass, and detections are merged across tiles.
+        overview=True adds the whole frame (at tile resolution) to that batch,
+        for close-ups of objects too big for one tile: its large boxes are
+        kept and replace the pieces the tile seams cut them into.
+        Returns {"counts", "total", "target", "tiles", "tiles_run", "boxes"
+        [[x0, y0, x1, y1, conf, class]]}.
+        """
+        img = cv2.imread(image) if isinstance(image, str) else image
+        if img is None:
+            raise ValueError(f"Could not read image '{image}'.")
+        h, w = img.shape[:2]
+        tiles = self._tile_grid(w, h, tile, overlap)
+        busy = tiles[self._busy_tiles(img, tiles)]
+
+        boxes, scores, classes, cut = [], [], [], []
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in busy] + ([img] if overview else [])
+        results = self.model.predict(crops, imgsz=tile, conf=conf, batch=len(crops), verbose=False) if crops else []
+        seam = 0.01 * tile
+        for corners, r in zip(busy, results):
+            x0, y0, x1, y1 = (int(v) for v in corners)
+            xyxy = r.boxes.xyxy + torch.tensor([x0, y0, x0, y0], dtype=r.boxes.xyxy.dtype)
+            boxes.append(xyxy)
+            scores.append(r.boxes.conf)
+            classes.append(r.boxes.cls.long())
+            # Touching a tile edge that isn't the image edge: may be part of a bigger object
+            cut.append(((xyxy[:, 0] <= x0 + seam) & (x0 > 0)) | ((xyxy[:, 1] <= y0 + seam) & (y0 > 0)) |
+                       ((xyxy[:, 2] >= x1 - seam) & (x1 < w)) | ((xyxy[:, 3] >= y1 - seam) & (y1 < h)))
+        boxes = torch.cat(boxes) if boxes else torch.zeros((0, 4))
+        scores = torch.cat(scores) if scores else torch.zeros(0)
+        classes = torch.cat(classes) if classes else torch.zeros(0, dtype=torch.long)
+        cut = torch.cat(cut) if cut else torch.zeros(0, dtype=torch.bool)
+
+        if overview:
+            r = results[-1]
+            # Only objects a seam can cut (longer than the tile overlap); tiles see smaller ones in full detail
+            large = (r.boxes.xyxy[:, 2:] - r.boxes.xyxy[:, :2]).max(dim=1).values >= overlap * tile
+            big, big_scores, big_classes = r.boxes.xyxy[large], r.boxes.conf[large], r.boxes.cls.long()[large]
+            keep = ~self._seam_pieces(boxes, classes, cut, big, big_classes)
+            boxes = torch.cat([boxes[keep], big.to(boxes.dtype)])
+            scores = torch.cat([scores[keep], big_scores.to(scores.dtype)])
+            classes = torch.cat([classes[keep], big_classes])
+        if len(boxes):
+            boxes, scores, classes = self._merge_tiles(boxes, scores, classes, iou)
+        counts = torch.bincount(classes, minlength=len(self.model.names))
+        counts = {self.model.names[i]: int(counts[i]) for i in torch.nonzero(counts).flatten().tolist()}
+        return {
+            "counts": counts,
+            "total": sum(counts.values()),
+            "target": self._target_count(counts, target_class),
+            "tiles": len(tiles),
+            "tiles_run": len(busy),
+            "boxes": [[round(v, 1) for v in b] + [round(float(s), 3), int(c)]
+                      for b, s, c in zip(boxes.tolist(), scores, classes)],
+        }
+
+    def benchmark_tiled(self, image_path, target_class="all", full_sizes=(640, 1280, None), runs=3, **tiled_args):
+        """
+        Full-frame YOLO at growing imgsz against count_tiled on one photo:
+        median seconds and the count each finds. None = the photo's own size,
+        i.e. the same pixels per object as the tiles: equal accuracy, and what
+        raising imgsz alone would cost. Run it on a wide shelf shot and on a
+        close-up with items larger than a tile (counted once per tile without
+        the overview pass).
+        """
+        img = cv2.imread(image_path)
+        rows = []
+        for size in full_sizes:
+            size = size or -(-max(img.shape[:2]) // 32) * 32  # YOLO wants multiples of its stride
+
+            def full(size=size):
+                r = self.model.predict(img, imgsz=size, verbose=False)[0]
+                return self._target_count(self._class_counts(r), target_class)
+            rows.append((f"full-frame {size}px", full))
+        rows.append(("tiled", lambda: self.count_tiled(img, target_class, **tiled_args)["target"]))
+        # A close-up of items bigger than a tile shows what the full-frame overview pass fixes
+        rows.append(("tiled, no overview", lambda: self.count_tiled(img, target_class, **{**tiled_args, "overview": False})["target"]))
+
+        print(f"[Vision] {image_path}: {img.shape[1]}x{img.shape[0]}")
+        for name, fn in rows:
+            fn()  # Warm-up
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                count = fn()
+                times.append(time.perf_counter() - start)
+            print(f"[Vision] {name:<18} {sorted(times)[len(times) // 2]:6.2f}s  count={count}")
 
     def capture_and_count(self):
         """
@@ -47,13 +300,74 @@ class InventoryCam:
         cap.release()
         
         if ret:
-            cv2.imwrite("temp_inventory.jpg", frame)
-            return self.count_stock("temp_inventory.jpg", target_class="all")
+            return self.count_stock(frame, target_class="all")  # YOLO takes the array directly
         else:
             return 0
 
+    def _detect(self, frame, conf):
+        """(boxes (N, 4) x0, y0, x1, y1, class names) for one BGR frame."""
+        r = self.model.predict(frame, conf=conf, verbose=False)[0]
+        return r.boxes.xyxy.numpy(), [self.model.names[i] for i in r.boxes.cls.long().tolist()]
+
+    def count_video(self, source=0, target_class="all", detect_every=5, conf=0.25, max_frames=None, tracker=None):
+        """
+        Counts unique items seen while walking a camera along a shelf (video
+        file path or capture index). YOLO runs on every detect_every-th frame,
+        straight from memory; an ObjectTracker links boxes across detections,
+        so an item in view for many frames is counted once. Items must be
+        detected on at least tracker.min_hits detection frames to count.
+        Pick detect_every so the view moves less than about an item's width
+        between detections, or neighbours get confused for each other.
+        Returns {"counts" {class: unique}, "total", "target", "frames",
+        "frames_detected", "fps"}.
+        """
+        tracker = tracker or ObjectTracker(iou_threshold=0.3, max_distance=0.75, max_missed=3, min_hits=2)
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video source '{source}'.")
+        start = time.perf_counter()
+        frame_index = detected = 0
+        try:
+            while max_frames is None or frame_index < max_frames:
+                ok, frame = cap.read() if frame_index % detect_every == 0 else (cap.grab(), None)
+                if not ok:
+                    break
+                if frame is not None:
+                    boxes, names = self._detect(frame, conf)
+                    tracker.update(boxes, frame_index, labels=names)
+                    detected += 1
+                frame_index += 1
+        except KeyboardInterrupt:
+            pass  # Live camera: Ctrl+C ends the walk, the count so far is returned
+        finally:
+            cap.release()
+        elapsed = time.perf_counter() - start
+        counts = dict(sorted(tracker.counts.items()))
+        summary = {
+            "counts": counts,
+            "total": tracker.confirmed,
+            "target": self._target_count(counts, target_class),
+            "frames": frame_index,
+            "frames_detected": detected,
+            "fps": round(frame_index / elapsed, 1) if elapsed else 0.0,
+        }
+        print(f"[Vision] {summary['total']} unique items in {frame_index} frames "
+              f"({detected} detected, {summary['fps']} frames/s): {counts}")
+        return summary
+
 # --- Test Block ---
 if __name__ == "__main__":
+    # python -m agri.mod_inventory_cam [photos_dir] [audit.csv|audit.jsonl]
+    # python -m agri.mod_inventory_cam stockroom.jpg closeup.jpg   (tiled vs full-frame benchmark)
+    # python -m agri.mod_inventory_cam shelf_walk.mp4     (unique items in a video)
+    import sys
     cam = InventoryCam()
     # count = cam.count_stock("market_stall.jpg", target_class="apple")
-    # print(f"Inventory Count: {count}")
\ No newline at end of file
+    # print(f"Inventory Count: {count}")
+    if len(sys.argv) > 1 and sys.argv[1].lower().endswith((".mp4", ".avi", ".mov", ".mkv")):
+        print(cam.count_video(sys.argv[1]))
+    elif len(sys.argv) > 1 and os.path.isfile(sys.argv[1]):
+        for path in sys.argv[1:]:
+            cam.benchmark_tiled(path)
+    elif len(sys.argv) > 1:
+        print(cam.audit(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "inventory_audit.csv"))
\ No newline at end of file
@@ -0,0 +1,131 @@
+import numpy as np
+
+def iou_matrix(a, b):
+    """IoU of every box in a (N, 4) against every box in b (M, 4), boxes as x0, y0, x1, y1."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x0 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y0 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x1 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y1 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+def _centers(boxes):
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+class Track:
+    def __init__(self, track_id, box, frame, label=None):
+        self.id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.label = label
+        self.velocity = np.zeros(2, dtype=np.float32)  # Centre px per frame
+        self.first_frame = frame
+        self.last_frame = frame
+        self.hits = 1
+        self.missed = 0
+        self.data = {}  # Free for the caller (e.g. the grade given to this fruit)
+
+    def predict(self, frame):
+        """Where the box should be at 'frame', moving at its last velocity."""
+        shift = self.velocity * (frame - self.last_frame)
+        return self.box + np.array([shift[0], shift[1], shift[0], shift[1]], dtype=np.float32)
+
+class ObjectTracker:
+    def __init__(self, iou_threshold=0.3, max_distance=0.75, max_missed=5, min_hits=2):
+        """
+        Lightweight IoU + centroid tracker for conveyor belts and shelf walks.
+        Each track's box is first moved by its velocity to the current frame,
+        so frames can be skipped. Boxes are matched to tracks greedily by IoU;
+        what's left is matched by centre distance (at most max_distance x the
+        track's box diagonal). Unmatched boxes start tracks; a track unseen
+        for max_missed updates is dropped. A track counts as a unique object
+        once it has been seen min_hits times (one-frame false positives don't).
+        Detections of different labels are never matched to each other.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.tracks = {}
+        self.next_id = 1
+        self.confirmed = 0  # Unique objects so far
+        self.counts = {}  # Unique objects per label
+
+    def update(self, boxes, frame, labels=None):
+        """Matches this frame's boxes (N, 4). Returns the Track of each box, in order."""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        labels = list(labels) if labels is not None else [None] * len(boxes)
+        tracks = list(self.tracks.values())
+        assigned = [None] * len(boxes)
+
+        if tracks and len(boxes):
+            predicted = np.stack([t.predict(frame) for t in tracks])
+            same_label = np.array([[t.label == label for label in labels] for t in tracks])
+            free_t, free_b = set(range(len(tracks))), set(range(len(boxes)))
+
+            iou = np.where(same_label, iou_matrix(predicted, boxes), 0.0)
+            for ti, bi in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[ti, bi] < self.iou_threshold:
+                    break
+                if ti in free_t and bi in free_b:
+                    assigned[bi] = tracks[ti]
+                    free_t.discard(ti)
+                    free_b.discard(bi)
+
+            if free_t and free_b:
+                diag = np.hypot(predicted[:, 2] - predicted[:, 0], predicted[:, 3] - predicted[:, 1])
+                dist = np.linalg.norm(_centers(predicted)[:, None] - _centers(boxes)[None], axis=2) / np.maximum(diag[:, None], 1e-6)
+                dist = np.where(same_label, dist, np.inf)
+                for ti, bi in zip(*np.unravel_index(np.argsort(dist, axis=None), dist.shape)):
+                    if dist[ti, bi] > self.max_distance:
+                        break
+                    if ti in free_t and bi in free_b:
+                        assigned[bi] = tracks[ti]
+                        free_t.discard(ti)
+                        free_b.discard(bi)
+
+        seen = set()
+        for bi, track in enumerate(assigned):
+            if track is None:
+                track = Track(self.next_id, boxes[bi], frame, labels[bi])
+                self.tracks[track.id] = track
+                self.next_id += 1
+                assigned[bi] = track
+            else:
+                gap = max(frame - track.last_frame, 1)
+                moved = (_centers(boxes[bi:bi + 1])[0] - _centers(track.box[None])[0]) / gap
+                track.velocity = moved if track.hits == 1 else 0.5 * track.velocity + 0.5 * moved
+                track.box = boxes[bi]
+                track.last_frame = frame
+                track.hits += 1
+                track.missed = 0
+            if track.hits == self.min_hits:
+                self.confirmed += 1
+                self.counts[track.label] = self.counts.get(track.label, 0) + 1
+            seen.add(track.id)
+
+        for track_id in [i for i in self.tracks if i not in seen]:
+            track = self.tracks[track_id]
+            track.missed += 1
+            if track.missed > self.max_missed:
+                del self.tracks[track_id]
+        return assigned
+
+    def reset(self):
+        self.tracks = {}
+        self.next_id = 1
+        self.confirmed = 0
+        self.counts = {}
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # Two boxes sliding right by 12 px a frame, detections only every 3rd frame
+    tracker = ObjectTracker()
+    for frame in range(0, 30, 3):
+        x = 12 * frame
+        tracks = tracker.update([[x, 10, x + 50, 60], [x + 200, 10, x + 250, 60]], frame)
+        print(frame, [t.id for t in tracks])
+    print(f"Unique objects: {tracker.confirmed}")
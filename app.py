@@ -2,11 +2,22 @@ import os
 import sqlite3
 import datetime
 import sys
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+import json
+import uuid
+import functools
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify, Response
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from markupsafe import escape
 from fpdf import FPDF 
+from utility.mod_thread_budget import budget
+budget.apply_env() # Before numpy/torch/llama.cpp create their thread pools
+from utility.mod_model_hub import hub
+from utility.mod_result_cache import ResultCache
+from utility.mod_job_queue import JobQueue
+from intelligence.mod_semantic_cache import SemanticCache
+from intelligence.mod_chat_session import SessionStore
 
 app = Flask(__name__)
 app.secret_key = 'karya_os_final_key'
@@ -71,6 +82,188 @@ TOOL_INFO = {
     'weather': {'title': 'Weather Cache', 'desc': 'Offline Forecast.', 'input_desc': 'Click Execute', 'output_desc': 'Weather Report'},
 }
 
+# --- MODEL HUB (Each engine loads once per worker, shared by all requests) ---
+# CNN runtime: eager | int8 | torchscript | onnx (build with 'python -m utility.mod_model_export build')
+CNN_RUNTIME = os.environ.get('KARYA_CNN_RUNTIME', 'eager')
+
+def _load_whisper():
+    import whisper
+    budget.apply_torch()
+    return whisper.load_model("base")
+
+def _load_tractor_doctor():
+    from diagnostic import mod_machinery_hear
+    return mod_machinery_hear.TractorDoctor(runtime=CNN_RUNTIME)
+
+def _load_crop_doctor():
+    from agri import mod_crop_doctor
+    doc = mod_crop_doctor.CropDoctor(runtime=CNN_RUNTIME)
+    doc.enable_batching(max_batch_size=16, max_wait_ms=10) # Overlapping uploads share one forward pass
+    return doc
+
+def _load_inventory_cam():
+    from agri import mod_inventory_cam
+    return mod_inventory_cam.InventoryCam()
+
+def _load_llama():
+    # One Llama, shared by all Flask threads: the scheduler serializes its calls
+    from intelligence import mod_llama_brain, mod_llm_scheduler
+    try:
+        engine = mod_llama_brain.LlamaEngine()
+    except SystemExit:  # The CLI's "model missing" exit must not take down a web worker thread
+        raise FileNotFoundError("TinyLlama GGUF not found: run 'download_tinyllama.py' first.") from None
+    return mod_llm_scheduler.LLMScheduler(engine)
+
+def _load_rag():
+    from intelligence import mod_rag_store
+    return mod_rag_store.RAGStore()
+
+hub.register('whisper', _load_whisper)
+hub.register('tractor_doctor', _load_tractor_doctor)
+hub.register('crop_doctor', _load_crop_doctor)
+hub.register('inventory_cam', _load_inventory_cam)
+hub.register('llama', _load_llama)
+hub.register('rag', _load_rag)
+
+# --- RESULT CACHE (Same upload + same model version -> answer from SQLite) ---
+result_cache = ResultCache(db_path='result_cache.db', max_bytes=int(os.environ.get('KARYA_RESULT_CACHE_MB', 64)) * 1024 * 1024)
+
+def _weights_tag(path):
+    # Retraining changes the file's mtime, which invalidates old results
+    return str(int(os.path.getmtime(path))) if os.path.exists(path) else 'mock'
+
+def model_version(tool):
+    versions = {
+        'tractor_doctor': f"audiocnn-windows/{CNN_RUNTIME}/{_weights_tag('tractor_net.pth')}",
+        'crop_doctor': f"mobilenet_v3/{CNN_RUNTIME}",
+        'inventory_cam': "yolov8n",
+        'quality_grader': "tray-segment-v1",
+        'chat_brain': "tinyllama-1.1b-chat-q4_k_m",
+    }
+    return versions[tool]
+
+# --- ANSWER CACHE (Near-identical chat questions reuse an earlier answer; opt-in per request) ---
+# Shares the RAG store's MiniLM encoder, which is only loaded on first use.
+semantic_cache = SemanticCache(encoder=lambda: hub.get('rag').encoder, db_path='semantic_cache.db',
+                               threshold=float(os.environ.get('KARYA_ANSWER_CACHE_THRESHOLD', 0.85)))
+
+# Give up on chat answers still waiting (or streaming) after this many seconds
+LLM_DEADLINE_S = float(os.environ.get('KARYA_LLM_DEADLINE_S', 120))
+
+# --- CHAT SESSIONS (Per-user history + llama KV state; idle ones are pickled to disk) ---
+chat_sessions = SessionStore(spill_dir='chat_sessions', max_memory_mb=int(os.environ.get('KARYA_CHAT_SESSION_MB', 256)))
+
+def _cached_answer(question):
+    # A broken cache must never break the chat, so failures count as a miss
+    try:
+        return semantic_cache.lookup(question, scope=model_version('chat_brain'))
+    except Exception as e:
+        print(f"Answer Cache Failed: {e}")
+        return None
+
+def _store_answer(question, answer):
+    try:
+        semantic_cache.put(question, answer, scope=model_version('chat_brain'))
+    except Exception as e:
+        print(f"Answer Cache Failed: {e}")
+
+# --- HEAVY TOOLS (Shared by the normal POST and the background job queue) ---
+# Each runner keeps the 'TRY REAL -> FALLBACK' behaviour and may report progress.
+jobs = JobQueue(workers={'whisper': 1, 'llama': 1, 'yolo': 2}, max_pending=16)
+
+def _no_report(percent, message=''): pass
+
+def _save_upload(f):
+    # A unique name per upload: queued jobs must not see a later upload with the same filename
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex[:12]}_{secure_filename(f.filename)}")
+    f.save(file_path)
+    return file_path
+
+def _remove_upload(file_path):
+    if file_path:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+def _removing_upload(runner):
+    # Job runner that deletes its upload once the job is over, however it ends
+    def run(file_path, text_input, report=_no_report):
+        try:
+            return runner(file_path, text_input, report=report)
+        finally:
+            _remove_upload(file_path)
+    return run
+
+def run_voice_interface(file_path, text_input, report=_no_report):
+    if not file_path: return "⚠️ Please upload an audio file."
+    try:
+        # TRY REAL
+        report(10, "Loading Whisper...")
+        model = hub.get('whisper')
+        report(20, "Decoding audio...")
+        from diagnostic.mod_audio_ingest import load_audio, WHISPER_RATE
+        audio, _ = load_audio(file_path, WHISPER_RATE)  # In-process decode, no ffmpeg subprocess
+        report(30, "Transcribing audio...")
+        result_data = model.transcribe(audio)
+        return f"💬 <b>Actual Transcript:</b><br>'{result_data['text']}'"
+    except Exception as e:
+        print(f"Voice Failed: {e}")
+        # FALLBACK
+        return "💬 <b>Transcript (Simulated):</b><br>'...checking price of Basmati rice at Azadpur Mandi today...'"
+
+def run_inventory_cam(file_path, text_input, report=_no_report):
+    try:
+        # TRY REAL
+        report(10, "Loading YOLO...")
+        count = result_cache.get_or_compute(file_path, 'inventory_cam', model_version('inventory_cam'),
+                                            lambda: hub.get('inventory_cam').count_stock(file_path))
+        return f"🔢 <b>Real Count:</b> {count} items detected."
+    except Exception as e:
+        print(f"Inventory Failed: {e}")
+        # FALLBACK
+        return "🔢 <b>Scan Results (Simulated):</b><br>Jute Sacks: 24<br>Crates: 12<br><b>Total: 36 Items</b>"
+
+CHAT_FALLBACK = "🤖 (AI Fallback): To prevent soil erosion during winter rains, ensure proper drainage channels are cleared."
+
+def run_chat_brain(file_path, text_input, report=_no_report, use_cache=False, session_id=None):
+    try: 
+        session = chat_sessions.get(session_id) if session_id is not None else None
+        # Follow-up questions depend on the conversation, so only first questions use the cache
+        use_cache = use_cache and not (session and session.turns)
+        if use_cache:
+            report(5, "Checking answer cache...")
+            hit = _cached_answer(text_input)
+            if hit:
+                if session is not None:
+                    session.turns.append((text_input, hit['answer']))
+                    chat_sessions.save(session)
+                # Cached answers were asked by other users: escape them and never echo their question
+                return f"{escape(hit['answer'])}<br><small>⚡ Instant answer ({hit['similarity'] * 100:.0f}% match)</small>"
+        # TRY REAL
+        report(10, "Loading TinyLlama...")
+        brain = hub.get('llama')
+        report(30, "Thinking...")
+        if session is not None:
+            answer = brain.chat(session, text_input, deadline=LLM_DEADLINE_S)
+            chat_sessions.save(session)
+        else:
+            answer = brain.generate_response(text_input, deadline=LLM_DEADLINE_S)
+        if use_cache:
+            _store_answer(text_input, answer)
+        return str(escape(answer))
+    except Exception as e:
+        print(f"Chat Failed: {e}") 
+        # FALLBACK
+        return CHAT_FALLBACK
+
+# tool -> (job queue, runner)
+HEAVY_TOOLS = {
+    'voice_interface': ('whisper', run_voice_interface),
+    'inventory_cam': ('yolo', run_inventory_cam),
+    'chat_brain': ('llama', run_chat_brain),
+}
+
 # --- AUTH CONFIG ---
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -114,6 +307,100 @@ def logout(): logout_user(); return redirect(url_for('login'))
 @login_required
 def dashboard(): return render_template('dashboard.html', name=current_user.username)
 
+@app.route('/models/stats')
+@login_required
+def model_stats(): return jsonify(hub.stats())
+
+@app.route('/threads/stats')
+@login_required
+def thread_stats(): return jsonify(budget.stats())
+
+@app.route('/cache/stats')
+@login_required
+def cache_stats(): return jsonify(result_cache.stats())
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = jobs.get(job_id, owner=current_user.id)
+    return jsonify(job) if job else (jsonify({'error': 'Unknown job'}), 404)
+
+@app.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    # Server-Sent Events: one message per progress change, closes when the job ends
+    owner = current_user.id
+    def stream():
+        seen = -1
+        while True:
+            job = jobs.get(job_id, owner=owner)
+            if job is None:
+                yield "event: missing\ndata: {}\n\n"; return
+            if job['version'] != seen:
+                seen = job['version']
+                yield f"data: {json.dumps(job)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job['status'] in ('done', 'failed'): return
+            jobs.wait_for_change(job_id, seen, timeout=15)
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/chat/stream')
+@login_required
+def chat_stream():
+    # Karya AI Chat, token by token (Server-Sent Events). Ends with a 'stats' event.
+    question = request.args.get('q', '').strip()
+    use_cache = request.args.get('cache') == '1'
+    session = chat_sessions.get(current_user.id)
+    def stream():
+        stats = {}
+        try:
+            first_question = not session.turns
+            hit = _cached_answer(question) if use_cache and first_question else None
+            if hit:
+                session.turns.append((question, hit['answer']))
+                chat_sessions.save(session)
+                yield f"data: {json.dumps({'token': hit['answer']})}\n\n"
+                stats = {'cached': True, 'similarity': hit['similarity']}
+            else:
+                brain = hub.get('llama')
+                pieces = []
+                for piece in brain.stream_chat(session, question, stats=stats, deadline=LLM_DEADLINE_S):
+                    pieces.append(piece)
+                    yield f"data: {json.dumps({'token': piece})}\n\n"
+                chat_sessions.save(session)
+                if use_cache and first_question:
+                    _store_answer(question, "".join(pieces).strip())
+        except Exception as e:
+            print(f"Chat Stream Failed: {e}")
+            yield f"data: {json.dumps({'token': CHAT_FALLBACK})}\n\n"
+        yield f"event: stats\ndata: {json.dumps(stats)}\n\n"
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/chat/reset', methods=['POST'])
+@login_required
+def chat_reset():
+    chat_sessions.reset(current_user.id)
+    return jsonify({'status': 'ok'})
+
+@app.route('/chat/sessions/stats')
+@login_required
+def chat_session_stats(): return jsonify(chat_sessions.stats())
+
+@app.route('/llm/stats')
+@login_required
+def llm_stats():
+    # Queue depth and wait times of the LLM scheduler (only once the model is loaded)
+    return jsonify(hub.get('llama').stats() if hub.is_loaded('llama') else {'loaded': False})
+
+@app.route('/chat/cache/stats')
+@login_required
+def answer_cache_stats(): return jsonify(semantic_cache.stats())
+
+@app.route('/jobs/stats')
+@login_required
+def job_stats(): return jsonify(jobs.stats())
+
 @app.route('/download/<filename>')
 def download_file(filename): return send_from_directory(app.config['GENERATED_FOLDER'], filename)
 
@@ -130,28 +417,29 @@ def feature_interface(section, tool):
         if 'file_input' in request.files:
             f = request.files['file_input']
             if f.filename != '' and allowed_file(f.filename):
-                filename = secure_filename(f.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                f.save(file_path)
+                file_path = _save_upload(f)
         
         text_input = request.form.get('text_input', '').strip()
 
+        # Heavy tools can run in the background: reply with a job id at once
+        if request.form.get('mode') == 'async' and tool in HEAVY_TOOLS:
+            queue_name, runner = HEAVY_TOOLS[tool]
+            if tool == 'chat_brain':
+                runner = functools.partial(runner, use_cache=bool(request.form.get('answer_cache')), session_id=current_user.id)
+            try:
+                job_id = jobs.submit(queue_name, _removing_upload(runner), file_path, text_input, owner=current_user.id)
+            except RuntimeError as e:
+                _remove_upload(file_path)
+                return jsonify({'error': str(e)}), 503
+            return jsonify({'job_id': job_id,
+                            'status_url': url_for('job_status', job_id=job_id),
+                            'events_url': url_for('job_events', job_id=job_id)}), 202
+
         # ================= MODULE 1: DIAGNOSTIC =================
 
         # 1. Voice Interface
         if tool == 'voice_interface':
-            if file_path:
-                try:
-                    # TRY REAL
-                    import whisper
-                    model = whisper.load_model("base") 
-                    result_data = model.transcribe(file_path)
-                    result = f"💬 <b>Actual Transcript:</b><br>'{result_data['text']}'"
-                except Exception as e:
-                    print(f"Voice Failed: {e}")
-                    # FALLBACK
-                    result = "💬 <b>Transcript (Simulated):</b><br>'...checking price of Basmati rice at Azadpur Mandi today...'"
-            else: result = "⚠️ Please upload an audio file."
+            result = run_voice_interface(file_path, text_input)
 
         # 2. Air-Gap Courier
         elif tool == 'airgap_courier':
@@ -177,10 +465,14 @@ def feature_interface(section, tool):
         elif tool == 'tractor_doctor':
             try:
                 # TRY REAL
-                from diagnostic import mod_machinery_hear
-                doc = mod_machinery_hear.TractorDoctor()
-                d, c = doc.diagnose(file_path)
-                result = f"🚜 <b>Analysis:</b> {d} (Conf: {c*100:.1f}%)"
+                report = result_cache.get_or_compute(file_path, tool, model_version(tool),
+                                                     lambda: hub.get('tractor_doctor').diagnose_recording(file_path))
+                result = (f"🚜 <b>Analysis:</b> {report['diagnosis']} (Conf: {report['confidence']*100:.1f}%)<br>"
+                          f"{report['duration_s']}s analysed in {report['windows']} windows")
+                faults = [s for s in report['segments'] if s['diagnosis'] != 'Healthy']
+                if faults:
+                    result += "<ul class='list-disc pl-5 mt-2'>" + "".join(
+                        f"<li>{s['start_s']}–{s['end_s']}s: {s['diagnosis']}</li>" for s in faults) + "</ul>"
             except Exception as e:
                 print(f"Tractor Failed: {e}")
                 # FALLBACK
@@ -197,8 +489,8 @@ def feature_interface(section, tool):
         elif tool == 'crop_doctor':
             try:
                 # TRY REAL
-                from agri import mod_crop_doctor; doc = mod_crop_doctor.CropDoctor()
-                d, c = doc.diagnose(file_path)
+                d, c = result_cache.get_or_compute(file_path, tool, model_version(tool),
+                                                   lambda: hub.get('crop_doctor').diagnose_queued(file_path))
                 result = f"🌿 <b>Real Diagnosis:</b> {d} ({c*100:.1f}%)"
             except Exception as e:
                 print(f"Crop Doctor Failed: {e}")
@@ -212,16 +504,7 @@ def feature_interface(section, tool):
 
         # 5. Inventory Cam
         elif tool == 'inventory_cam':
-            try:
-                # TRY REAL
-                from agri import mod_inventory_cam
-                cam = mod_inventory_cam.InventoryCam()
-                count = cam.count_stock(file_path)
-                result = f"🔢 <b>Real Count:</b> {count} items detected."
-            except Exception as e:
-                print(f"Inventory Failed: {e}")
-                # FALLBACK
-                result = "🔢 <b>Scan Results (Simulated):</b><br>Jute Sacks: 24<br>Crates: 12<br><b>Total: 36 Items</b>"
+            result = run_inventory_cam(file_path, text_input)
         
         # 6. Quality Grader
         elif tool == 'quality_grader':
@@ -229,8 +512,11 @@ def feature_interface(section, tool):
                 # TRY REAL
                 from agri import mod_quality_grader
                 grader = mod_quality_grader.QualityGrader()
-                g = grader.grade_fruit(file_path)
-                result = f"🍎 <b>Real Grade:</b> {g}"
+                tray = result_cache.get_or_compute(file_path, tool, model_version(tool),
+                                                   lambda: grader.grade_tray(file_path))
+                dist = tray['distribution']
+                result = (f"🍎 <b>Real Grade:</b> {tray['grade']}<br>"
+                          f"{tray['fruits']} fruits: A {dist['A']} · B {dist['B']} · C {dist['C']}")
             except Exception as e:
                 print(f"Grader Failed: {e}")
                 # FALLBACK
@@ -240,22 +526,14 @@ def feature_interface(section, tool):
 
         # 7. Chat (Real Llama -> Fallback)
         elif tool == 'chat_brain':
-            try: 
-                # TRY REAL
-                from intelligence import mod_llama_brain
-                brain = mod_llama_brain.LlamaEngine()
-                result = brain.generate_response(text_input)
-            except Exception as e:
-                print(f"Chat Failed: {e}") 
-                # FALLBACK
-                result = "🤖 (AI Fallback): To prevent soil erosion during winter rains, ensure proper drainage channels are cleared."
+            result = run_chat_brain(file_path, text_input, use_cache=bool(request.form.get('answer_cache')),
+                                    session_id=current_user.id)
 
         # 8. RAG Search
         elif tool == 'rag_search':
             try:
                 # TRY REAL
-                from intelligence import mod_rag_store
-                rag = mod_rag_store.RAGStore()
+                rag = hub.get('rag')
                 result = rag.retrieve(text_input)
             except Exception as e:
                 print(f"RAG Failed: {e}")
@@ -376,7 +654,11 @@ def feature_interface(section, tool):
         else:
             result = "⚠️ Feature logic not linked."
 
-    return render_template('feature.html', section=section, tool=tool, meta=meta, result=result, pdf_file=pdf_file)
+        _remove_upload(file_path)  # Answered (the result cache keys on content, not on this file)
+
+    return render_template('feature.html', section=section, tool=tool, meta=meta, result=result, pdf_file=pdf_file,
+                           async_job=tool in HEAVY_TOOLS,
+                           stream_url=url_for('chat_stream') if tool == 'chat_brain' else None)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
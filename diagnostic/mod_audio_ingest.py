@@ -0,0 +1,162 @@
+import os
+import time
+import math
+import struct
+import functools
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, resample_poly
+
+# Rates the engines expect
+WHISPER_RATE = 16000
+TRACTOR_RATE = 22050
+
+# WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_EXTENSIBLE
+_WAV_PCM, _WAV_FLOAT, _WAV_EXTENSIBLE = 1, 3, 0xFFFE
+
+@functools.lru_cache(maxsize=16)
+def _ratio(orig_sr, target_sr):
+    g = math.gcd(int(orig_sr), int(target_sr))
+    return int(target_sr) // g, int(orig_sr) // g  # (up, down)
+
+@functools.lru_cache(maxsize=16)
+def _filter(up, down):
+    """
+    The same low-pass FIR that scipy's resample_poly designs on every call
+    (Kaiser beta 5, 10 zero crossings per side). 44.1k -> 16k is 160/441, so
+    that is 8821 taps; designing it once per rate pair saves that each clip.
+    """
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0)).astype(np.float32)
+    taps.flags.writeable = False  # Shared by every call (resample_poly copies it)
+    return taps
+
+def resample(audio, orig_sr, target_sr):
+    """Polyphase resampling of a float32 array (1-D, or (frames, channels))."""
+    if int(orig_sr) == int(target_sr):
+        return np.asarray(audio, dtype=np.float32)
+    up, down = _ratio(orig_sr, target_sr)
+    return resample_poly(audio, up, down, axis=0, window=_filter(up, down)).astype(np.float32, copy=False)
+
+def _to_mono(audio):
+    if audio.ndim == 1:
+        return audio
+    # A mat-vec is ~20x faster than mean(axis=1) on interleaved (frames, channels) data
+    return audio @ np.full(audio.shape[1], 1.0 / audio.shape[1], dtype=audio.dtype)
+
+def load_audio(path, sample_rate=TRACTOR_RATE, mono=True, offset=0.0, duration=None):
+    """
+    Drop-in for librosa.load(path, sr=sample_rate): returns (float32 audio,
+    sample_rate). WAV/FLAC/OGG/MP3 are decoded by libsndfile in-process; other
+    formats (m4a, ...) fall back to librosa, which goes through ffmpeg.
+    """
+    try:
+        info = sf.info(path)
+        start = int(offset * info.samplerate)
+        frames = int(duration * info.samplerate) if duration is not None else -1
+        audio, orig_sr = sf.read(path, start=start, frames=frames, dtype="float32", always_2d=True)
+    except (sf.LibsndfileError, RuntimeError, TypeError):
+        import librosa
+        return librosa.load(path, sr=sample_rate, mono=mono, offset=offset, duration=duration)
+    if mono:
+        audio = _to_mono(audio)
+    audio = resample(audio, orig_sr, sample_rate)
+    return (audio if mono else audio.T), sample_rate
+
+def wav_memmap(path):
+    """
+    Maps the sample data of an uncompressed WAV (16/32-bit PCM or 32-bit
+    float) as a (frames, channels) array without reading it. Returns
+    (array, sample_rate), or None for any other file.
+    """
+    try:
+        with open(path, "rb") as f:
+            riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+            if riff != b"RIFF" or wave != b"WAVE":
+                return None
+            fmt = None
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return None
+                chunk_id, size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    fmt = struct.unpack("<HHIIHH", f.read(16))
+                    f.seek(size - 16 + (size & 1), os.SEEK_CUR)
+                elif chunk_id == b"data" and fmt is not None:
+                    data_offset, data_size = f.tell(), size
+                    break
+                else:
+                    f.seek(size + (size & 1), os.SEEK_CUR)
+    except (OSError, struct.error):
+        return None
+
+    tag, channels, rate, _, _, bits = fmt
+    if tag == _WAV_EXTENSIBLE:
+        tag = _WAV_FLOAT if bits == 32 and sf.info(path).subtype == "FLOAT" else _WAV_PCM
+    dtype = {(_WAV_PCM, 16): np.int16, (_WAV_PCM, 32): np.int32, (_WAV_FLOAT, 32): np.float32}.get((tag, bits))
+    if dtype is None:
+        return None
+    frames = min(data_size, os.path.getsize(path) - data_offset) // (channels * np.dtype(dtype).itemsize)
+    return np.memmap(path, dtype=dtype, mode="r", offset=data_offset, shape=(frames, channels)), rate
+
+def _as_float(samples):
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    if samples.dtype == np.int32:
+        return samples.astype(np.float32) / 2147483648.0
+    return np.asarray(samples, dtype=np.float32)
+
+def iter_chunks(path, sample_rate=TRACTOR_RATE, chunk_seconds=10.0):
+    """
+    Yields mono float32 chunks of a long recording at sample_rate, reading
+    only about chunk_seconds at a time. WAVs are memory-mapped; each chunk is
+    resampled with a little audio either side (the filter's reach), so the
+    joined chunks equal resampling the whole file at once.
+    """
+    mapped = wav_memmap(path)
+    if mapped is None:
+        audio, _ = load_audio(path, sample_rate)
+        step = int(chunk_seconds * sample_rate)
+        for start in range(0, len(audio), step):
+            yield audio[start:start + step]
+        return
+
+    samples, orig_sr = mapped
+    up, down = _ratio(orig_sr, sample_rate)
+    # Chunk starts on multiples of 'down' map to whole output samples
+    step = max(down, int(chunk_seconds * orig_sr) // down * down)
+    margin = down * math.ceil((10 * max(up, down) / up + 1) / down)
+    total = len(samples)
+    for start in range(0, total, step):
+        stop = min(start + step, total)
+        lo, hi = max(0, start - margin), min(total, stop + margin)
+        chunk = resample(_to_mono(_as_float(samples[lo:hi])), orig_sr, sample_rate)
+        skip = (start - lo) * up // down
+        keep = -(-(stop - start) * up // down)
+        yield chunk[skip:skip + keep]
+
+def benchmark(path, repeats=5):
+    """Times librosa.load against load_audio at the Whisper and TractorDoctor rates."""
+    import librosa
+    librosa.load(path, sr=TRACTOR_RATE)  # Warm up imports and caches for both
+    load_audio(path, TRACTOR_RATE)
+    print(f"[Audio] {path}: {sf.info(path).duration:.1f}s at {sf.info(path).samplerate} Hz")
+    for rate in (WHISPER_RATE, TRACTOR_RATE):
+        for name, fn in (("librosa.load", lambda: librosa.load(path, sr=rate)),
+                         ("load_audio", lambda: load_audio(path, rate))):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                fn()
+            print(f"[Audio] {name:<13} -> {rate} Hz: {(time.perf_counter() - start) / repeats * 1000:.1f} ms")
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m diagnostic.mod_audio_ingest recording.wav
+    import sys
+    path = sys.argv[1]
+    audio, rate = load_audio(path, WHISPER_RATE)
+    print(f"Decoded {len(audio)} samples at {rate} Hz (Whisper input)")
+    chunked = np.concatenate(list(iter_chunks(path, WHISPER_RATE, chunk_seconds=2.0)))
+    print(f"Chunked read matches the full decode: {np.allclose(chunked, audio, atol=1e-5)}")
+    benchmark(path)
@@ -0,0 +1,167 @@
+import time
+import queue
+import numpy as np
+import librosa
+import torch
+from diagnostic.mod_audio_ingest import iter_chunks
+
+def wav_source(path, sample_rate=22050, block_size=1024, realtime=False):
+    """
+    Yields float32 mono blocks from an audio file, the same way mic_source
+    does from the microphone. realtime=True paces blocks at playback speed.
+    Long WAVs are read a few seconds at a time (mod_audio_ingest.iter_chunks).
+    """
+    block_seconds = block_size / sample_rate
+    start = time.perf_counter()
+    pending = np.zeros(0, dtype=np.float32)
+    i = 0
+    for chunk in iter_chunks(path, sample_rate):
+        pending = np.concatenate([pending, chunk])
+        while len(pending) >= block_size:
+            if realtime:
+                delay = start + i * block_seconds - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield pending[:block_size]
+            pending = pending[block_size:]
+            i += 1
+    if len(pending):
+        yield pending
+
+def mic_source(sample_rate=22050, block_size=1024, duration=None):
+    """Yields float32 mono blocks from the default microphone (until 'duration' seconds, or forever)."""
+    import sounddevice as sd
+    blocks = queue.Queue()
+
+    def callback(indata, frames, time_info, status):
+        blocks.put(indata[:, 0].copy())
+
+    total = 0
+    with sd.InputStream(samplerate=sample_rate, channels=1, blocksize=block_size, dtype="float32", callback=callback):
+        while duration is None or total < duration * sample_rate:
+            block = blocks.get()
+            total += len(block)
+            yield block
+
+class StreamingDiagnoser:
+    def __init__(self, doctor, hop_seconds=0.5, smoothing=0.6, window_frames=80, n_fft=2048, hop_length=512, n_mels=40):
+        """
+        Continuous TractorDoctor. Audio arrives in small blocks; each new
+        hop_length samples add one mel frame (one FFT), and frames go into a
+        ring buffer holding the last window_frames (= the 40x80 input AudioCNN
+        expects, ~1.9 s). Every hop_seconds the window is classified and the
+        class probabilities are smoothed with an exponential moving average
+        (smoothing = weight of the past), so the verdict doesn't flicker.
+        """
+        self.doctor = doctor
+        self.sample_rate = doctor.sample_rate
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.window_frames = window_frames
+        self.hop_frames = max(1, int(round(hop_seconds * self.sample_rate / hop_length)))
+        self.smoothing = smoothing
+        # Same filters as librosa.feature.melspectrogram in TractorDoctor.preprocess
+        self.mel_basis = librosa.filters.mel(sr=self.sample_rate, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+        self.fft_window = librosa.filters.get_window("hann", n_fft, fftbins=True).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self._samples = np.zeros(0, dtype=np.float32)  # Not yet framed (< n_fft + one block)
+        self._mel = np.zeros((self.mel_basis.shape[0], self.window_frames), dtype=np.float32)  # Ring of power frames
+        self._frames = 0  # Total mel frames produced
+        self._since_window = 0
+        self._pending_ms = 0.0  # Featurization time since the last window
+        self._smoothed = None
+        self.latencies_ms = []
+
+    def _add_frames(self, samples, n):
+        """Turns the first n frames of 'samples' into mel columns (one vectorized FFT)."""
+        frames = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop_length][:n]
+        power = np.abs(np.fft.rfft(frames * self.fft_window, axis=1)) ** 2
+        mel = self.mel_basis @ power.T.astype(np.float32)  # (n_mels, n)
+        for column in mel.T:
+            self._mel[:, self._frames % self.window_frames] = column
+            self._frames += 1
+
+    def _window(self):
+        """The ring buffer in time order, as a dB spectrogram (like preprocess)."""
+        pos = self._frames % self.window_frames
+        mel = np.concatenate([self._mel[:, pos:], self._mel[:, :pos]], axis=1)
+        return librosa.power_to_db(mel, ref=np.max)
+
+    def feed(self, block):
+        """Adds one block of samples. Returns the (possibly empty) list of new diagnoses."""
+        start = time.perf_counter()
+        samples = np.concatenate([self._samples, np.asarray(block, dtype=np.float32).ravel()])
+        results = []
+        while len(samples) >= self.n_fft:
+            # Frames until the next window is due: a full window first, then every hop
+            due = self.window_frames - self._frames if self._frames < self.window_frames else \
+                self.hop_frames - self._since_window
+            n = min(due, 1 + (len(samples) - self.n_fft) // self.hop_length)
+            self._add_frames(samples, n)
+            samples = samples[n * self.hop_length:]
+            self._since_window += n
+            if n == due:
+                self._pending_ms += (time.perf_counter() - start) * 1000
+                results.append(self._classify())
+                start = time.perf_counter()
+        self._samples = samples
+        self._pending_ms += (time.perf_counter() - start) * 1000
+        return results
+
+    def _classify(self):
+        start = time.perf_counter()
+        tensor = torch.tensor(self._window(), dtype=torch.float32).unsqueeze(0).unsqueeze(0)
+        with torch.no_grad():
+            probs = torch.nn.functional.softmax(self.doctor.model(tensor), dim=1)[0].numpy()
+        if self._smoothed is None:
+            self._smoothed = probs
+        else:
+            self._smoothed = self.smoothing * self._smoothed + (1 - self.smoothing) * probs
+        latency = self._pending_ms + (time.perf_counter() - start) * 1000
+        self.latencies_ms.append(latency)
+        self._pending_ms = 0.0
+        self._since_window = 0
+
+        best, raw = int(np.argmax(self._smoothed)), int(np.argmax(probs))
+        return {
+            "time_s": round(self._frames * self.hop_length / self.sample_rate, 2),  # End of the window
+            "diagnosis": self.doctor.labels[best],
+            "confidence": round(float(self._smoothed[best]), 3),
+            "raw_diagnosis": self.doctor.labels[raw],
+            "raw_confidence": round(float(probs[raw]), 3),
+            "latency_ms": round(latency, 2),
+        }
+
+    def stream(self, source):
+        """Feeds a block source (wav_source / mic_source) and yields each diagnosis as it happens."""
+        for block in source:
+            yield from self.feed(block)
+
+    def stats(self):
+        lat = sorted(self.latencies_ms)
+        hop_ms = self.hop_frames * self.hop_length / self.sample_rate * 1000
+        return {
+            "windows": len(lat),
+            "hop_ms": round(hop_ms, 1),
+            "latency_ms_median": round(lat[len(lat) // 2], 2) if lat else 0.0,
+            "latency_ms_p95": round(lat[int(len(lat) * 0.95)], 2) if lat else 0.0,
+            "latency_ms_max": round(lat[-1], 2) if lat else 0.0,
+            # < 1.0 means each window is done well before the next one is due
+            "load_factor": round(lat[len(lat) // 2] / hop_ms, 3) if lat else 0.0,
+        }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m diagnostic.mod_engine_stream [engine.wav]   (no file: live microphone for 10 s)
+    import sys
+    from diagnostic.mod_machinery_hear import TractorDoctor
+
+    doc = TractorDoctor()
+    live = StreamingDiagnoser(doc, hop_seconds=0.5)
+    source = wav_source(sys.argv[1], realtime=True) if len(sys.argv) > 1 else mic_source(duration=10)
+    for result in live.stream(source):
+        print(f"[{result['time_s']:6.2f}s] {result['diagnosis']:<14} {result['confidence']:.2f} "
+              f"(raw {result['raw_diagnosis']}, {result['latency_ms']:.1f} ms)")
+    print(live.stats())
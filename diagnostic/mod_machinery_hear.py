@@ -5,6 +5,9 @@ import sounddevice as sd
 import numpy as np
 import librosa
 import os
+from utility import mod_model_export
+from utility.mod_thread_budget import budget
+from diagnostic.mod_audio_ingest import load_audio
 
 # --- 1. Define the PyTorch Model Architecture ---
 class AudioCNN(nn.Module):
@@ -27,20 +30,63 @@ class AudioCNN(nn.Module):
         x = self.fc2(x)
         return x
 
+# Class index -> name (the order AudioCNN's outputs and tractor_net.pth use)
+LABELS = {0: "Healthy", 1: "Belt Slippage", 2: "Engine Knock"}
+
+def mel_windows(audio_array, sample_rate=22050, window_frames=80, hop_frames=40):
+    """
+    One mel spectrogram for the whole recording, cut into overlapping
+    windows of window_frames. Each window gets its own dB reference (like
+    a clip passed to preprocess). Returns ((N, n_mels, window_frames)
+    float32 array, start frame of each window). Training features come from
+    here too (mod_tractor_train), so they match inference exactly.
+    """
+    S = librosa.feature.melspectrogram(y=audio_array, sr=sample_rate, n_mels=40)
+    n_frames = S.shape[1]
+    if n_frames < window_frames:
+        S_dB = librosa.power_to_db(S, ref=np.max)
+        S_dB = np.pad(S_dB, ((0, 0), (0, window_frames - n_frames)))
+        return S_dB[None].astype(np.float32), [0]
+
+    starts = list(range(0, n_frames - window_frames + 1, hop_frames))
+    if starts[-1] != n_frames - window_frames:
+        starts.append(n_frames - window_frames)  # Make sure the tail is analysed too
+
+    # Same maths as librosa.power_to_db(ref=np.max, top_db=80), per window, in one pass
+    log_S = 10.0 * np.log10(np.maximum(1e-10, S))
+    windows = np.lib.stride_tricks.sliding_window_view(log_S, window_frames, axis=1)[:, starts]  # (mels, N, frames)
+    windows = windows.transpose(1, 0, 2)
+    windows = windows - windows.max(axis=(1, 2), keepdims=True)
+    windows = np.maximum(windows, -80.0)
+    return windows.astype(np.float32), starts
+
 class TractorDoctor:
-    def __init__(self, model_path="tractor_net.pth"):
+    def __init__(self, model_path="tractor_net.pth", runtime="eager"):
+        """
+        runtime: "eager" (fp32 PyTorch), or "int8" / "torchscript" / "onnx" to load
+        an artifact built by 'python -m utility.mod_model_export build'.
+        """
         self.sample_rate = 22050
-        self.labels = {0: "Healthy", 1: "Belt Slippage", 2: "Engine Knock"}
-        
-        # Initialize Model
-        self.model = AudioCNN(num_classes=len(self.labels))
+        self.labels = LABELS
+        self.runtime = runtime
+        budget.apply_torch()
         
-        # Load weights if they exist, else warn (safe for dev)
-        if os.path.exists(model_path):
-            self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
-            print("[Mechanic] PyTorch weights loaded.")
+        # Exported artifact first (fast path for low-end CPUs)
+        self.model = mod_model_export.load_exported("tractor_net", runtime, weights_path=model_path)
+        if self.model is not None:
+            print(f"[Mechanic] Loaded exported model ({runtime}).")
         else:
-            print("[Mechanic] Warning: No weights found. Using random init (Mock Mode).")
+            self.runtime = "eager"
+
+            # Initialize Model
+            self.model = AudioCNN(num_classes=len(self.labels))
+            
+            # Load weights if they exist, else warn (safe for dev)
+            if os.path.exists(model_path):
+                self.model.load_state_dict(torch.load(model_path, map_location=torch.device('cpu')))
+                print("[Mechanic] PyTorch weights loaded.")
+            else:
+                print("[Mechanic] Warning: No weights found. Using random init (Mock Mode).")
         
         self.model.eval() # Set to inference mode
 
@@ -82,6 +128,61 @@ class TractorDoctor:
         
         return diagnosis, confidence
 
+    def diagnose_windows(self, audio_array, window_frames=80, hop_frames=40, batch_size=64):
+        """
+        Diagnoses a whole recording (array at self.sample_rate), not just its
+        first ~1.9 s: overlapping windows (hop_frames=40 is 50% overlap) go
+        through AudioCNN as one batch (split into batch_size chunks).
+        Returns {"diagnosis", "confidence", "duration_s", "windows", "share",
+        "segments", "timeline"}. The verdict is the class with the highest
+        mean probability over all windows; 'segments' merges consecutive
+        windows with the same label.
+        """
+        windows, starts = mel_windows(np.asarray(audio_array, dtype=np.float32), self.sample_rate, window_frames, hop_frames)
+        batch = torch.from_numpy(windows).unsqueeze(1)
+        with torch.no_grad():
+            probs = torch.cat([
+                torch.nn.functional.softmax(self.model(batch[i:i + batch_size]), dim=1)
+                for i in range(0, len(batch), batch_size)
+            ]).numpy()
+
+        frame_s = 512 / self.sample_rate  # librosa's default hop_length
+        duration = len(audio_array) / self.sample_rate
+        timeline = []
+        for start, p in zip(starts, probs):
+            best = int(np.argmax(p))
+            timeline.append({
+                "start_s": round(start * frame_s, 2),
+                "end_s": round(min((start + window_frames) * frame_s, duration), 2),
+                "diagnosis": self.labels[best],
+                "confidence": round(float(p[best]), 3),
+            })
+
+        segments = []
+        for window in timeline:
+            if segments and segments[-1]["diagnosis"] == window["diagnosis"]:
+                segments[-1]["end_s"] = window["end_s"]
+            else:
+                segments.append({"start_s": window["start_s"], "end_s": window["end_s"], "diagnosis": window["diagnosis"]})
+
+        mean = probs.mean(axis=0)
+        best = int(np.argmax(mean))
+        labels = [w["diagnosis"] for w in timeline]
+        return {
+            "diagnosis": self.labels[best],
+            "confidence": round(float(mean[best]), 3),
+            "duration_s": round(duration, 2),
+            "windows": len(timeline),
+            "share": {name: round(labels.count(name) / len(labels), 3) for name in self.labels.values()},
+            "segments": segments,
+            "timeline": timeline,
+        }
+
+    def diagnose_recording(self, path, **kwargs):
+        """Decodes an audio file once and runs diagnose_windows on all of it."""
+        audio, _ = load_audio(path, self.sample_rate)
+        return self.diagnose_windows(audio, **kwargs)
+
 if __name__ == "__main__":
     doc = TractorDoctor()
     
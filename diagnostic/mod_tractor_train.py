@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import Dataset, DataLoader
+from diagnostic.mod_machinery_hear import AudioCNN, LABELS, mel_windows
+from diagnostic.mod_audio_ingest import load_audio, TRACTOR_RATE
+from utility.mod_thread_budget import budget
+from utility.mod_memmap import grow_npy, grown_capacity
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+def _label_of(folder):
+    """'belt_slippage', 'Belt Slippage', 'belt-slippage' -> 1. None for unknown folders."""
+    name = folder.lower().replace("_", " ").replace("-", " ")
+    for index, label in LABELS.items():
+        if label.lower() == name:
+            return index
+    return None
+
+class FeatureStore:
+    def __init__(self, store_dir="tractor_features", window_frames=80, hop_frames=40):
+        """
+        Mel windows of every training recording, computed once.
+        features.npy  memory-mapped (rows, 40, window_frames) float32
+        labels.npy    class index of each row
+        index.json    per file: size, mtime, label and its row range
+        sync() only featurizes files that are new or changed since the last
+        run; rows of deleted/changed files are compacted away.
+        """
+        self.dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.features_path = os.path.join(store_dir, "features.npy")
+        self.labels_path = os.path.join(store_dir, "labels.npy")
+        self.index_path = os.path.join(store_dir, "index.json")
+
+        self.index = {"count": 0, "window_frames": window_frames, "hop_frames": hop_frames, "files": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                index = json.load(f)
+            if (index["window_frames"], index["hop_frames"]) == (window_frames, hop_frames):
+                self.index = index
+            else:
+                print("[Features] Window settings changed: rebuilding the store.")
+        self._features = None
+        self._labels = None
+        if self.index["count"]:
+            self._open_arrays()
+
+    def _open_arrays(self):
+        self._features = np.load(self.features_path, mmap_mode="r+")
+        self._labels = np.load(self.labels_path, mmap_mode="r+")
+
+    def _grow(self, needed):
+        """Doubles the mapped capacity (amortized O(1) appends)."""
+        capacity = 0 if self._features is None else self._features.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = grown_capacity(needed, capacity)
+        n = self.index["count"]
+        grow_npy(self.features_path, self._features, n, new_capacity, np.float32, (40, self.index["window_frames"]))
+        grow_npy(self.labels_path, self._labels, n, new_capacity, np.int64)
+        self._features = self._labels = None
+        self._open_arrays()
+
+    def _save_index(self):
+        self._features.flush()
+        self._labels.flush()
+        with open(self.index_path + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def count(self):
+        return self.index["count"]
+
+    def _drop(self, keys):
+        """Removes the rows of these files and compacts the arrays."""
+        files = self.index["files"]
+        keep = np.ones(self.index["count"], dtype=bool)
+        for key in keys:
+            start, end = files.pop(key)["rows"]
+            keep[start:end] = False
+        rows = np.flatnonzero(keep)
+        self._features[:len(rows)] = self._features[rows]
+        self._labels[:len(rows)] = self._labels[rows]
+        # Row ranges shift down by the number of dropped rows before them
+        shift = np.concatenate([[0], np.cumsum(~keep)])
+        for entry in files.values():
+            start, end = entry["rows"]
+            entry["rows"] = [start - int(shift[start]), end - int(shift[start])]
+        self.index["count"] = len(rows)
+
+    def sync(self, recordings_dir):
+        """
+        Featurizes recordings_dir/<label>/*.wav (label folder names as in
+        LABELS, e.g. 'belt_slippage'). Returns throughput stats. A recording
+        that can't be decoded is skipped, listed in stats["failed"] and
+        retried on the next run.
+        """
+        found = {}
+        for folder in sorted(os.listdir(recordings_dir)):
+            path = os.path.join(recordings_dir, folder)
+            if not os.path.isdir(path):
+                continue
+            label = _label_of(folder)
+            if label is None:
+                print(f"[Features] Skipping '{folder}': not one of {list(LABELS.values())}")
+                continue
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    stat = os.stat(os.path.join(path, name))
+                    found[f"{folder}/{name}"] = {"size": stat.st_size, "mtime": stat.st_mtime, "label": label}
+
+        files = self.index["files"]
+        stale = [key for key, entry in files.items() if key not in found or
+                 (entry["size"], entry["mtime"], entry["label"]) != (found[key]["size"], found[key]["mtime"], found[key]["label"])]
+        if stale:
+            self._drop(stale)
+        new = [key for key in found if key not in files]
+
+        start = time.perf_counter()
+        audio_seconds = 0.0
+        windows_added = 0
+        failed = []
+        try:
+            for key in new:
+                try:
+                    audio, _ = load_audio(os.path.join(recordings_dir, key), TRACTOR_RATE)
+                    windows, _ = mel_windows(audio, TRACTOR_RATE, self.index["window_frames"], self.index["hop_frames"])
+                except Exception as e:
+                    # One bad recording must not lose the rest of the run; it isn't indexed, so it's retried
+                    print(f"[Features] Failed '{key}': {e!r}")
+                    failed.append(key)
+                    continue
+                n = self.index["count"]
+                self._grow(n + len(windows))
+                self._features[n:n + len(windows)] = windows
+                self._labels[n:n + len(windows)] = found[key]["label"]
+                files[key] = {**found[key], "rows": [n, n + len(windows)]}
+                self.index["count"] = n + len(windows)
+                audio_seconds += len(audio) / TRACTOR_RATE
+                windows_added += len(windows)
+        finally:
+            # Also on an unexpected error (disk full, Ctrl-C): rows written so far stay indexed
+            if self._features is not None:
+                self._save_index()
+        elapsed = time.perf_counter() - start
+
+        new = [key for key in new if key not in failed]
+        stats = {
+            "files_new": len(new),
+            "files_unchanged": len(found) - len(new) - len(failed),
+            "files_removed": len(stale) - len([key for key in stale if key in found]),
+            "windows_added": windows_added,
+            "windows_total": self.index["count"],
+            "seconds": round(elapsed, 2),
+            "files_per_s": round(len(new) / elapsed, 1) if new else 0.0,
+            "audio_s_per_s": round(audio_seconds / elapsed, 1) if new else 0.0,
+            "windows_per_s": round(windows_added / elapsed, 1) if new else 0.0,
+            "failed": failed,
+        }
+        print(f"[Features] {stats['files_new']} new files ({stats['files_unchanged']} unchanged), "
+              f"{stats['windows_added']} windows in {stats['seconds']}s: "
+              f"{stats['audio_s_per_s']}x realtime, {stats['windows_per_s']} windows/s"
+              + (f", {len(failed)} failed" if failed else ""))
+        return stats
+
+    def split(self, val_fraction=0.2, seed=0):
+        """
+        (train rows, validation rows), split by recording: overlapping windows
+        of one file never end up on both sides.
+        """
+        keys = sorted(self.index["files"])
+        rng = np.random.default_rng(seed)
+        rng.shuffle(keys)
+        n_val = int(round(len(keys) * val_fraction)) if len(keys) > 1 else 0
+        val_keys = set(keys[:n_val])
+        train, val = [], []
+        for key, entry in self.index["files"].items():
+            (val if key in val_keys else train).extend(range(*entry["rows"]))
+        return np.array(sorted(train), dtype=np.int64), np.array(sorted(val), dtype=np.int64)
+
+class MelDataset(Dataset):
+    def __init__(self, store, rows):
+        """Rows of a FeatureStore. Each DataLoader worker maps features.npy itself."""
+        self.features_path = store.features_path
+        self.labels = np.asarray(store._labels[:store.count()])
+        self.rows = rows
+        self._features = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if self._features is None:
+            self._features = np.load(self.features_path, mmap_mode="r")
+        row = self.rows[i]
+        return torch.from_numpy(np.array(self._features[row])).unsqueeze(0), int(self.labels[row])
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_features"] = None  # A memmap would be pickled as a full copy
+        return state
+
+def _accuracy(model, loader):
+    correct = total = 0
+    model.eval()
+    with torch.no_grad():
+        for x, y in loader:
+            correct += (model(x).argmax(dim=1) == y).sum().item()
+            total += len(y)
+    return correct / total if total else None
+
+def train(store, out_path="tractor_net.pth", epochs=30, batch_size=64, workers=2, lr=1e-4, val_fraction=0.2, seed=0):
+    """
+    Trains AudioCNN from the feature store and writes its state_dict to
+    out_path (the weights TractorDoctor loads). Keeps the epoch with the best
+    validation accuracy (or the last one, without a validation split).
+    """
+    budget.apply_torch()
+    torch.manual_seed(seed)
+    train_rows, val_rows = store.split(val_fraction, seed)
+    if not len(train_rows):
+        raise ValueError("The feature store is empty: run sync() on a recordings folder first.")
+    loader_args = {"batch_size": batch_size, "num_workers": workers, "persistent_workers": workers > 0}
+    train_loader = DataLoader(MelDataset(store, train_rows), shuffle=True, **loader_args)
+    val_loader = DataLoader(MelDataset(store, val_rows), **loader_args) if len(val_rows) else None
+
+    model = AudioCNN(num_classes=len(LABELS))
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.CrossEntropyLoss()
+    best_acc, best_state = -1.0, None
+    start = time.perf_counter()
+    for epoch in range(1, epochs + 1):
+        model.train()
+        total_loss = 0.0
+        for x, y in train_loader:
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(y)
+        val_acc = _accuracy(model, val_loader) if val_loader else None
+        if val_acc is None or val_acc >= best_acc:
+            best_acc = val_acc if val_acc is not None else best_acc
+            best_state = {k: v.clone() for k, v in model.state_dict().items()}
+        elapsed = time.perf_counter() - start
+        print(f"[Train] Epoch {epoch}/{epochs}: loss {total_loss / len(train_rows):.4f}"
+              + (f", val acc {val_acc * 100:.1f}%" if val_acc is not None else "")
+              + f" ({epoch / elapsed:.2f} epochs/s)")
+
+    elapsed = time.perf_counter() - start
+    torch.save(best_state, out_path + ".tmp")
+    os.replace(out_path + ".tmp", out_path)
+    print(f"[Train] Saved '{out_path}'. Rebuild exported runtimes with 'python -m utility.mod_model_export build'.")
+    return {
+        "epochs": epochs,
+        "seconds": round(elapsed, 2),
+        "epochs_per_s": round(epochs / elapsed, 3),
+        "samples_per_s": round(epochs * len(train_rows) / elapsed, 1),
+        "train_windows": len(train_rows),
+        "val_windows": len(val_rows),
+        "best_val_acc": round(best_acc, 4) if best_acc >= 0 else None,
+    }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m diagnostic.mod_tractor_train recordings/ [epochs] [workers]
+    #   recordings/healthy/*.wav, recordings/belt_slippage/*.wav, recordings/engine_knock/*.wav
+    import sys
+    store = FeatureStore()
+    store.sync(sys.argv[1])
+    print(train(store, epochs=int(sys.argv[2]) if len(sys.argv) > 2 else 30,
+                workers=int(sys.argv[3]) if len(sys.argv) > 3 else 2))
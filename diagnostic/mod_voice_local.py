@@ -2,7 +2,9 @@ import speech_recognition as sr
 import pyttsx3
 import whisper
 import warnings
-import os
+import numpy as np
+from utility.mod_thread_budget import budget
+from diagnostic.mod_audio_ingest import WHISPER_RATE
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
@@ -11,6 +13,7 @@ class VoiceBot:
     def __init__(self):
         print("[System] Loading local Whisper model (tiny) on PyTorch...")
         # 'tiny' is ~75MB. It runs on CPU.
+        budget.apply_torch()
         self.stt_model = whisper.load_model("tiny")
         
         # Initialize Text-to-Speech (Offline)
@@ -30,17 +33,15 @@ class VoiceBot:
         with mic as source:
             recognizer.adjust_for_ambient_noise(source)
             audio_data = recognizer.record(source, duration=duration)
-            
-            with open("temp_audio.wav", "wb") as f:
-                f.write(audio_data.get_wav_data())
+
+        # 16 kHz 16-bit PCM straight into a float32 array (no temp WAV, no ffmpeg)
+        pcm = audio_data.get_raw_data(convert_rate=WHISPER_RATE, convert_width=2)
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
 
         print("[System] Transcribing...")
         # Whisper uses PyTorch internally
-        result = self.stt_model.transcribe("temp_audio.wav")
+        result = self.stt_model.transcribe(audio)
         text = result['text'].strip()
-        
-        if os.path.exists("temp_audio.wav"):
-            os.remove("temp_audio.wav")
             
         return text
 
@@ -0,0 +1,137 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ChatSession:
+    def __init__(self, session_id):
+        """
+        One user's conversation.
+        turns: [(question, answer), ...] still inside the context window.
+        state: llama state (KV cache) right after the last answer, so the next
+               turn only evaluates its own tokens. None until the first answer.
+        """
+        self.session_id = session_id
+        self.turns = []
+        self.state = None
+        self.model = None  # Which model produced 'state'
+        self.dropped_turns = 0  # Turns that slid out of the window
+        self.last_used = time.time()
+
+    def nbytes(self):
+        if self.state is None:
+            return 0
+        return len(self.state.llama_state) + self.state.scores.nbytes + self.state.input_ids.nbytes
+
+class SessionStore:
+    def __init__(self, spill_dir="chat_sessions", max_memory_mb=256, idle_seconds=600):
+        """
+        Keeps ChatSessions in RAM up to max_memory_mb of llama state. Sessions
+        idle for longer than idle_seconds, and then the least recently used
+        ones while over the cap, are pickled to spill_dir and read back when
+        their user returns.
+        """
+        self.spill_dir = spill_dir
+        self.max_bytes = max_memory_mb * 1024 * 1024
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()  # session_id -> ChatSession, LRU order
+        self._lock = threading.Lock()
+        self.spilled = 0
+        self.restored = 0
+        os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, session_id):
+        name = hashlib.sha1(str(session_id).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.spill_dir, f"session_{name}.pkl")
+
+    def get(self, session_id):
+        """Returns the user's session (from RAM, from disk, or a new one)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._restore(session_id) or ChatSession(session_id)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def _restore(self, session_id):
+        path = self._spill_path(session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                session = pickle.load(f)
+        except Exception as e:
+            print(f"[Sessions] Could not read '{path}': {e}")
+            return None
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        self.restored += 1
+        return session
+
+    def _spill(self, session_id):
+        session = self._sessions.pop(session_id)
+        tmp = self._spill_path(session_id) + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._spill_path(session_id))
+        self.spilled += 1
+
+    def save(self, session):
+        """Call after a turn: the session grew, so re-check idle time and the memory cap."""
+        with self._lock:
+            session.last_used = time.time()
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            self._enforce()
+
+    def _enforce(self):
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_seconds:
+                self._spill(session_id)
+        # Oldest first, but never the session that was just used
+        while len(self._sessions) > 1 and self._memory_bytes() > self.max_bytes:
+            self._spill(next(iter(self._sessions)))
+
+    def _memory_bytes(self):
+        return sum(s.nbytes() for s in self._sessions.values())
+
+    def reset(self, session_id):
+        """Forgets a conversation (RAM and disk)."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            path = self._spill_path(session_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def stats(self):
+        with self._lock:
+            on_disk = sum(1 for name in os.listdir(self.spill_dir) if name.endswith(".pkl"))
+            return {
+                "in_memory": len(self._sessions),
+                "on_disk": on_disk,
+                "memory_mb": round(self._memory_bytes() / (1024 * 1024), 1),
+                "max_memory_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "spilled": self.spilled,
+                "restored": self.restored,
+            }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m intelligence.mod_chat_session (the LLM side is in mod_llama_brain's test block)
+    import shutil
+
+    store = SessionStore(spill_dir="test_chat_sessions", idle_seconds=0)
+    session = store.get("farmer_1")
+    session.turns.append(("My wheat leaves have orange spots.", "That looks like leaf rust."))
+    store.save(session)  # idle_seconds=0: spilled to disk at once
+    print(store.stats())
+    print(f"Restored turns: {store.get('farmer_1').turns}")
+    print(store.stats())
+
+    shutil.rmtree("test_chat_sessions")
@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import hashlib
+
+TEXT_EXTENSIONS = {".txt", ".md"}
+PDF_EXTENSIONS = {".pdf"}
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iter_source_files(paths):
+    """Expands files and directories (recursively) into supported document paths."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in TEXT_EXTENSIONS | PDF_EXTENSIONS:
+                        yield os.path.join(root, name)
+        elif os.path.isfile(path):
+            yield path
+
+def iter_pages(path):
+    """Streams a document one page (PDF) or one block (text) at a time."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in PDF_EXTENSIONS:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise ImportError("install 'pypdf' to read PDFs") from None
+        for page in PdfReader(path).pages:
+            yield (page.extract_text() or "") + "\n" # Page break is a word break
+    else:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            while True:
+                block = f.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+
+def iter_chunks(pages, chunk_words=180, overlap_words=40):
+    """
+    Word-window chunker over a stream of pages. Windows run across page
+    boundaries and neighbouring chunks share overlap_words words, so an
+    answer split between two chunks is still found.
+    """
+    step = chunk_words - overlap_words
+    buffer = []
+    carry = ""
+    for text in pages:
+        # Don't cut a word in half at a block boundary
+        text = carry + text
+        cut = max(text.rfind(" "), text.rfind("\n"))
+        carry, text = (text[cut + 1:], text[:cut]) if cut != -1 else ("", text)
+        buffer.extend(text.split())
+        while len(buffer) >= chunk_words:
+            yield " ".join(buffer[:chunk_words])
+            buffer = buffer[step:]
+    buffer.extend(carry.split())
+    if buffer:
+        yield " ".join(buffer)
+
+class DocIngestor:
+    def __init__(self, store, batch_size=64, flush_size=512, chunk_words=180, overlap_words=40):
+        """
+        Bulk loader for RAGStore.
+        store: a RAGStore (its encoder and index are used).
+        batch_size: SentenceTransformer.encode batch size.
+        flush_size: chunks encoded and written to the index per round trip.
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_size = flush_size
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        # Next to the index it describes: each backend keeps its own record of ingested files
+        self.manifest_path = os.path.join(store.index.dir, "ingest_manifest.json")
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        """path -> {"hash": sha256, "chunks": n}. Lets re-runs skip unchanged files."""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        return {}
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        with open(self.manifest_path, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+
+    def _flush(self, docs, metas, ids):
+        if not docs:
+            return
+        embeddings = self.store.encoder.encode(docs, batch_size=self.batch_size, show_progress_bar=False)
+        self.store.index.add(ids, embeddings, docs, metas)
+        docs.clear(); metas.clear(); ids.clear()
+
+    def _remove_missing(self, paths, seen):
+        """
+        Drops the chunks and manifest entries of files under the ingested
+        roots that this run didn't see, and of files that no longer exist.
+        """
+        roots = [os.path.join(os.path.abspath(p), "") for p in paths if os.path.isdir(p)]
+        gone = [key for key in self.manifest if key not in seen and
+                (not os.path.exists(key) or any(key.startswith(root) for root in roots))]
+        for key in gone:
+            self.store.index.delete(where={"path": key})
+            del self.manifest[key]
+            print(f"[Ingest] Removed {os.path.basename(key)}: no longer in the corpus")
+        if gone:
+            self._save_manifest()
+        return len(gone)
+
+    def ingest(self, paths):
+        """
+        Ingests files/directories. Unchanged files (same sha256) are skipped;
+        changed files have their old chunks replaced. A file that can't be read
+        is listed in stats["failed"] and retried on the next run. Files that
+        were ingested before but are gone (deleted, or moved/renamed along with
+        their folder) lose their chunks. Returns a stats dict.
+        """
+        stats = {"files": 0, "skipped": 0, "chunks": 0, "removed": 0, "failed": [], "seconds": 0.0}
+        start = time.perf_counter()
+        docs, metas, ids = [], [], []
+        seen = set()
+
+        for path in iter_source_files(paths):
+            key = os.path.abspath(path)
+            seen.add(key)
+            source = os.path.basename(path)
+            try:
+                digest = file_hash(path)
+                if self.manifest.get(key, {}).get("hash") == digest:
+                    stats["skipped"] += 1
+                    continue
+
+                # File changed (or is new): drop its old chunks first
+                if key in self.manifest:
+                    self._flush(docs, metas, ids)
+                    self.store.index.delete(where={"path": key})
+                    del self.manifest[key]
+                    self._save_manifest()
+
+                # Ids follow the path, so identical copies of a file don't collide
+                prefix = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+                count = 0
+                for i, chunk in enumerate(iter_chunks(iter_pages(path), self.chunk_words, self.overlap_words)):
+                    docs.append(chunk)
+                    metas.append({"source": source, "path": key, "file_hash": digest, "chunk": i})
+                    ids.append(f"{prefix}_{i}")
+                    count += 1
+                    if len(docs) >= self.flush_size:
+                        self._flush(docs, metas, ids)
+                self._flush(docs, metas, ids)
+            except Exception as e:
+                # One unreadable file must not abort the run: undo its partial chunks, retry it next time
+                print(f"[Ingest] Failed '{path}': {e}")
+                docs.clear(); metas.clear(); ids.clear()
+                try:
+                    self.store.index.delete(where={"path": key})
+                except Exception as cleanup_error:
+                    print(f"[Ingest] Could not remove partial chunks of '{path}': {cleanup_error}")
+                stats["failed"].append(path)
+                continue
+
+            if count:  # An empty read is retried next run instead of being remembered as done
+                self.manifest[key] = {"hash": digest, "chunks": count}
+                self._save_manifest()  # After every file, so an interrupted run can resume
+            stats["files"] += 1
+            stats["chunks"] += count
+            print(f"[Ingest] {source}: {count} chunks")
+
+        stats["removed"] = self._remove_missing(paths, seen)
+        self.store.index.flush()
+        stats["seconds"] = round(time.perf_counter() - start, 2)
+        stats["chunks_per_sec"] = round(stats["chunks"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        print(f"[Ingest] {stats['files']} files ({stats['skipped']} unchanged, {stats['removed']} removed), "
+              f"{stats['chunks']} chunks in {stats['seconds']}s = {stats['chunks_per_sec']} chunks/sec"
+              + (f", {len(stats['failed'])} failed" if stats["failed"] else ""))
+        return stats
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m intelligence.mod_doc_ingest manuals/ schemes/handbook.pdf
+    from intelligence.mod_rag_store import RAGStore
+
+    targets = sys.argv[1:] or ["manuals"]
+    kb = RAGStore()
+    kb.ingest(targets)
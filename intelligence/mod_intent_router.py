@@ -0,0 +1,168 @@
+import time
+import numpy as np
+
+# Labelled examples per intent (same labels as LlamaEngine.classify_intent).
+# Each label's centroid is the mean of its examples' embeddings.
+INTENT_EXAMPLES = {
+    "DIAGNOSE_MACHINERY": [
+        "My tractor engine is making a knocking sound.",
+        "The water pump is vibrating and making noise.",
+        "Tractor belt is slipping and squealing.",
+        "Harvester engine overheats after an hour.",
+        "Black smoke is coming from the tractor exhaust.",
+        "Diesel engine won't start in the morning.",
+        "Hydraulic lift of my tractor is not working.",
+        "There is a grinding noise from the gearbox.",
+        "Thresher motor stops suddenly.",
+        "My sprayer pump has lost pressure.",
+    ],
+    "CHECK_SCHEMES": [
+        "Is there a subsidy for solar pumps?",
+        "Am I eligible for PM-Kisan?",
+        "How do I apply for crop insurance under Fasal Bima Yojana?",
+        "What government schemes are there for women farmers?",
+        "Is there a loan waiver scheme this year?",
+        "How to get a Kisan Credit Card?",
+        "Subsidy on drip irrigation for small farmers.",
+        "When will the next PM-Kisan installment come?",
+        "Free soil health card kaise milega?",
+        "Which scheme gives money for buying a tractor?",
+    ],
+    "MARKET_PRICE": [
+        "What is the price of tomatoes today?",
+        "Onion rate in the mandi.",
+        "Wheat MSP this season?",
+        "How much is basmati rice selling for at Azadpur?",
+        "Current potato price per quintal.",
+        "Where can I get the best rate for my cotton?",
+        "Mustard bhav today.",
+        "Is the price of soybean going up?",
+        "Sell price of milk per litre at the dairy.",
+        "Today's rate of green chilli in Nashik.",
+    ],
+    "GENERAL_CHAT": [
+        "How are you?",
+        "Hello, who are you?",
+        "Thank you for the help.",
+        "Tell me a joke.",
+        "What is your name?",
+        "Good morning!",
+        "Can you speak Hindi?",
+        "What can you do?",
+        "Why should I use organic fertilizer?",
+        "How to make compost at home?",
+    ],
+}
+
+class IntentRouter:
+    def __init__(self, encoder=None, llm=None, threshold=0.35, min_margin=0.05, examples=None):
+        """
+        Nearest-centroid intent classifier on MiniLM sentence embeddings.
+        Queries it is unsure about (best cosine below threshold, or too close
+        to the runner-up) are sent to the LLM router instead.
+
+        encoder: a SentenceTransformer. Pass RAGStore().encoder to share the
+                 model that is already in memory.
+        llm: a LlamaEngine, or a zero-argument callable returning one (so
+             TinyLlama is only loaded if a fallback is actually needed).
+        """
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        self.encoder = encoder
+        self._llm = llm
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.labels, self.centroids = self._build_centroids(examples or INTENT_EXAMPLES)
+        self.stats = {"fast": 0, "llm_fallback": 0}
+
+    def _build_centroids(self, examples):
+        labels = list(examples)
+        centroids = []
+        for label in labels:
+            emb = self.encoder.encode(examples[label], normalize_embeddings=True)
+            c = emb.mean(axis=0)
+            centroids.append(c / np.linalg.norm(c))
+        return labels, np.stack(centroids).astype(np.float32)
+
+    def _get_llm(self):
+        if self._llm is not None and not hasattr(self._llm, "classify_intent"):
+            self._llm = self._llm()  # Lazy factory
+        return self._llm
+
+    def route(self, query):
+        """
+        Returns (intent, confidence, source), where source is "embedding" or "llm".
+        confidence is the cosine similarity to the winning centroid.
+        """
+        q = self.encoder.encode([query], normalize_embeddings=True)[0]
+        sims = self.centroids @ q
+        order = np.argsort(sims)[::-1]
+        best, second = sims[order[0]], sims[order[1]] if len(order) > 1 else -1.0
+        label = self.labels[order[0]]
+
+        if (best >= self.threshold and best - second >= self.min_margin) or self._get_llm() is None:
+            self.stats["fast"] += 1
+            return label, float(best), "embedding"
+
+        self.stats["llm_fallback"] += 1
+        return self._get_llm().classify_intent(query), float(best), "llm"
+
+    def classify_intent(self, query):
+        """Drop-in replacement for LlamaEngine.classify_intent."""
+        return self.route(query)[0]
+
+# --- Benchmark ---
+
+# Held-out queries (not in INTENT_EXAMPLES)
+BENCHMARK_SET = [
+    ("Engine knocking when I plough uphill.", "DIAGNOSE_MACHINERY"),
+    ("My pump motor hums but no water comes.", "DIAGNOSE_MACHINERY"),
+    ("Tractor clutch feels hard to press.", "DIAGNOSE_MACHINERY"),
+    ("Rotavator blade is wobbling.", "DIAGNOSE_MACHINERY"),
+    ("Any government help for buying a borewell pump?", "CHECK_SCHEMES"),
+    ("Documents needed for the crop insurance claim.", "CHECK_SCHEMES"),
+    ("Pension scheme for old farmers?", "CHECK_SCHEMES"),
+    ("Subsidy for polyhouse farming.", "CHECK_SCHEMES"),
+    ("Garlic price in Indore market today.", "MARKET_PRICE"),
+    ("What rate are traders paying for maize?", "MARKET_PRICE"),
+    ("Should I sell my chana now or wait for better price?", "MARKET_PRICE"),
+    ("Banana wholesale rate per dozen.", "MARKET_PRICE"),
+    ("Namaste!", "GENERAL_CHAT"),
+    ("Who made you?", "GENERAL_CHAT"),
+    ("Best time to sow wheat?", "GENERAL_CHAT"),
+    ("Thanks, that was useful.", "GENERAL_CHAT"),
+]
+
+def benchmark(router, llm=None, dataset=BENCHMARK_SET):
+    """Accuracy and per-query latency: embedding router vs the LLM-only path."""
+    paths = [("router", router.classify_intent)]
+    if llm is not None:
+        paths.append(("llm_only", llm.classify_intent))
+
+    for name, classify in paths:
+        correct, times = 0, []
+        for query, expected in dataset:
+            start = time.perf_counter()
+            correct += classify(query) == expected
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        print(f"[Router] {name:<9} accuracy {correct / len(dataset) * 100:5.1f}%  "
+              f"median {times[len(times) // 2]:7.1f} ms  p95 {times[int(len(times) * 0.95) - 1]:7.1f} ms")
+    print(f"[Router] Routing sources: {router.stats}")
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m intelligence.mod_intent_router [--llm]
+    import sys
+    from intelligence.mod_rag_store import RAGStore
+
+    engine = None
+    if "--llm" in sys.argv:
+        from intelligence.mod_llama_brain import LlamaEngine
+        engine = LlamaEngine()
+
+    router = IntentRouter(encoder=RAGStore().encoder, llm=engine)
+    for q in ["My tractor is making a weird noise.", "Tomato bhav kya hai?"]:
+        print(f"Q: {q} -> {router.route(q)}")
+    benchmark(router, engine)
@@ -0,0 +1,100 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+# Keeps part numbers and scheme names together ("3055-ab", "pm-kisan", "v2.1")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+def tokenize(text):
+    """Lowercase word tokens. Compound tokens also emit their parts, so
+    'PM-Kisan' matches both 'pm-kisan' and 'kisan'."""
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        tokens.append(tok)
+        parts = re.split(r"[-_./]", tok)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        In-process Okapi BM25 keyword index (inverted lists in plain dicts).
+        Complements vector search on exact strings such as part numbers.
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_len = {}
+        self.doc_terms = {}  # doc_id -> its terms, for cheap removal
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, ids, documents):
+        for doc_id, text in zip(ids, documents):
+            if doc_id in self.doc_len:
+                self.remove([doc_id])
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                self.postings[term][doc_id] = tf
+            length = sum(counts.values())
+            self.doc_len[doc_id] = length
+            self.doc_terms[doc_id] = list(counts)
+            self.total_len += length
+
+    def remove(self, ids):
+        for doc_id in ids:
+            if doc_id not in self.doc_len:
+                continue
+            for term in self.doc_terms.pop(doc_id):
+                plist = self.postings[term]
+                del plist[doc_id]
+                if not plist:
+                    del self.postings[term]
+            self.total_len -= self.doc_len.pop(doc_id)
+
+    def search(self, query, k=10):
+        """Returns [(doc_id, score), ...] best first."""
+        n = len(self.doc_len)
+        if n == 0:
+            return []
+        avg_len = self.total_len / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_id, tf in plist.items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges several best-first id lists. A document's fused score is
+    sum(1 / (k + rank)) over the lists it appears in, so raw BM25 and
+    cosine scores never need to be put on the same scale.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+# --- Test Block ---
+if __name__ == "__main__":
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        [
+            "Replace filter part 3055-AB every 250 hours.",
+            "PM-Kisan scheme provides 6000 rupees per year.",
+            "Loosen the alternator bolt to tighten the fan belt.",
+        ],
+    )
+    print(index.search("part number 3055-AB"))
+    print(index.search("kisan"))
+    print(reciprocal_rank_fusion([["a", "b"], ["b", "c"]]))
@@ -1,11 +1,41 @@
-from llama_cpp import Llama
+from llama_cpp import Llama, LlamaGrammar
+import llama_cpp
+from utility.mod_thread_budget import budget
+from collections import OrderedDict
+import numpy as np
 import os
 import sys
+import time
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful rural assistant."
+
+# Intent router prompt (fixed, so its KV state can be cached)
+VALID_INTENTS = ["DIAGNOSE_MACHINERY", "CHECK_SCHEMES", "MARKET_PRICE", "GENERAL_CHAT"]
+
+ROUTER_INSTRUCTION = (
+    "You are a router. Classify the user query into EXACTLY one of these categories: "
+    "[DIAGNOSE_MACHINERY, CHECK_SCHEMES, MARKET_PRICE, GENERAL_CHAT]. "
+    "Do not explain. Reply ONLY with the category name."
+)
+
+# Few-shot examples to help the small model understand
+ROUTER_EXAMPLES = (
+    "Examples:\n"
+    "User: My tractor engine is making a knocking sound.\nAssistant: DIAGNOSE_MACHINERY\n"
+    "User: Is there a subsidy for solar pumps?\nAssistant: CHECK_SCHEMES\n"
+    "User: What is the price of tomatoes today?\nAssistant: MARKET_PRICE\n"
+    "User: How are you?\nAssistant: GENERAL_CHAT\n"
+)
 
 class LlamaEngine:
-    def __init__(self, model_path="models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"):
+    def __init__(self, model_path="models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf", prefix_cache=True,
+                 intent_mode="sample", n_threads=None):
         """
         Initializes the TinyLlama model on CPU.
+        prefix_cache: evaluate fixed prompt prefixes (router prompt, default
+        system prompt) once and restore their saved KV state on later calls.
+        intent_mode: default for classify_intent ("sample", "logprob" or "grammar").
+        n_threads: llama.cpp threads; default is this worker's share of the cores (mod_thread_budget).
         """
         # 1. Validation: Check if model exists
         if not os.path.exists(model_path):
@@ -22,27 +52,87 @@ class LlamaEngine:
             model_path=model_path, 
             n_ctx=2048, 
             verbose=False,
-            n_threads=4 # Uses 4 CPU cores for speed
+            n_threads=n_threads or budget.threads("llama")
         )
         print("[Brain] Model Loaded. Ready to think.")
+        self.model_path = model_path
+
+        # Prompt prefix -> (tokens, saved llama state)
+        self.prefix_cache = prefix_cache
+        self._prefix_states = OrderedDict()
+        self.max_prefixes = 8
+        self.prefix_stats = {"saved": 0, "restored": 0, "already_loaded": 0}
+
+        self.intent_mode = intent_mode
+        self._intent_grammar = None
+
+    def _prompt_prefix(self, system_prompt=DEFAULT_SYSTEM_PROMPT, user_prefix=""):
+        """Fixed start of a prompt: everything before the variable user text."""
+        return f"<|system|>\n{system_prompt}</s>\n<|user|>\n{user_prefix}"
 
-    def _format_prompt(self, user_input, system_prompt="You are a helpful rural assistant."):
+    def _format_prompt(self, user_input, system_prompt=DEFAULT_SYSTEM_PROMPT):
         """
         TinyLlama specific prompt formatting.
         Structure: <|system|>...</s><|user|>...</s><|assistant|>
         """
-        return f"<|system|>\n{system_prompt}</s>\n<|user|>\n{user_input}</s>\n<|assistant|>\n"
+        return self._prompt_prefix(system_prompt) + f"{user_input}</s>\n<|assistant|>\n"
 
-    def generate_response(self, user_input, context=""):
+    def _use_prefix(self, prefix):
         """
-        Generates a natural language response.
+        Leaves the KV cache holding exactly 'prefix'. The first time, the prefix
+        is evaluated and the llama state saved; afterwards the state is restored.
+        llama-cpp then sees the next prompt starts with tokens it already has
+        and only evaluates the suffix (the user's text).
         """
+        if not self.prefix_cache:
+            return
+        entry = self._prefix_states.get(prefix)
+        if entry is None:
+            tokens = self.llm.tokenize(prefix.encode("utf-8"), special=True)
+            self.llm.reset()
+            self.llm.eval(tokens)
+            entry = (tokens, self._compact_state())
+            self._prefix_states[prefix] = entry
+            if len(self._prefix_states) > self.max_prefixes:
+                self._prefix_states.popitem(last=False)
+            self.prefix_stats["saved"] += 1
+            print(f"[Brain] Cached prompt prefix ({len(tokens)} tokens).")
+            return
+
+        self._prefix_states.move_to_end(prefix)
+        tokens, state = entry
+        n = len(tokens)
+        # Skip the copy if the KV cache already starts with this prefix
+        if self.llm.n_tokens >= n and list(self.llm.input_ids[:n]) == tokens:
+            self.prefix_stats["already_loaded"] += 1
+            return
+        self.llm.load_state(state)
+        self.prefix_stats["restored"] += 1
+
+    def _compact_state(self):
+        """
+        save_state() also copies one row of logits per cached token (n_vocab
+        floats, ~128 KB per token for TinyLlama). A restored state is always
+        re-evaluated from at least its last token, so those rows are never
+        read: keep a single row, which load_state() broadcasts back.
+        """
+        state = self.llm.save_state()
+        state.scores = state.scores[-1:].copy()
+        return state
+
+    def _chat_prompt(self, user_input, context=""):
         # Inject context if provided (e.g., from RAG)
         full_input = user_input
         if context:
             full_input = f"Context info: {context}\n\nUser Question: {user_input}"
+        return self._format_prompt(full_input)
 
-        prompt = self._format_prompt(full_input)
+    def generate_response(self, user_input, context=""):
+        """
+        Generates a natural language response.
+        """
+        prompt = self._chat_prompt(user_input, context)
+        self._use_prefix(self._prompt_prefix())
         
         output = self.llm(
             prompt, 
@@ -53,43 +143,208 @@ class LlamaEngine:
         )
         return output['choices'][0]['text'].strip()
 
-    def classify_intent(self, user_input):
+    def stream_response(self, user_input, context="", stats=None):
+        """
+        Same answer as generate_response, but yields text pieces as soon as
+        llama.cpp samples them. If a dict is passed as 'stats', it is filled with
+        ttft_ms (time to first token), tokens, total_s and tokens_per_sec.
+        """
+        prompt = self._chat_prompt(user_input, context)
+        start = time.perf_counter()
+        self._use_prefix(self._prompt_prefix())
+        first = None
+        tokens = 0
+
+        for chunk in self.llm(
+            prompt,
+            max_tokens=200,
+            stop=["</s>", "<|user|>"],
+            echo=False,
+            temperature=0.7,
+            stream=True # One chunk per sampled token
+        ):
+            piece = chunk['choices'][0]['text']
+            if not piece:
+                continue
+            if first is None:
+                first = time.perf_counter()
+                piece = piece.lstrip() # Match generate_response's strip()
+            tokens += 1
+            if stats is not None:
+                stats.update(self._stream_stats(start, first, tokens))
+            yield piece
+
+        if stats is not None:
+            stats.update(self._stream_stats(start, first, tokens))
+
+    def _session_prompt(self, turns, user_input):
+        history = "".join(f"{q}</s>\n<|assistant|>\n{a}</s>\n<|user|>\n" for q, a in turns)
+        return self._prompt_prefix() + history + f"{user_input}</s>\n<|assistant|>\n"
+
+    def stream_chat(self, session, user_input, stats=None, max_tokens=200):
+        """
+        Multi-turn chat for a ChatSession (see mod_chat_session). The session's
+        saved KV state is restored, so only the new question is evaluated
+        instead of the whole history. When history + answer would no longer
+        fit in n_ctx, the oldest turns slide out of the window.
+        Yields text pieces; 'stats' gets the stream_response fields plus
+        prompt_tokens and reused_tokens (served from the saved state).
+        """
+        prompt_budget = self.llm.n_ctx() - max_tokens
+        while True:
+            tokens = self.llm.tokenize(self._session_prompt(session.turns, user_input).encode("utf-8"), special=True)
+            if len(tokens) <= prompt_budget or not session.turns:
+                break
+            session.turns.pop(0)
+            session.dropped_turns += 1
+
+        start = time.perf_counter()
+        state = session.state if session.model == self.model_path else None
+        if state is None:
+            self._use_prefix(self._prompt_prefix())
+        elif not (self.llm.n_tokens >= state.n_tokens and
+                  np.array_equal(self.llm.input_ids[:state.n_tokens], state.input_ids[:state.n_tokens])):
+            self.llm.load_state(state)
+
+        # What llama-cpp will skip: the common prefix of the KV cache and the prompt
+        limit = min(self.llm.n_tokens, len(tokens) - 1)
+        mismatch = np.nonzero(self.llm.input_ids[:limit] != np.asarray(tokens[:limit]))[0]
+        reused = int(mismatch[0]) if len(mismatch) else limit
+
+        pieces = []
+        first = None
+        for chunk in self.llm(
+            tokens,
+            max_tokens=max_tokens,
+            stop=["</s>", "<|user|>"],
+            echo=False,
+            temperature=0.7,
+            stream=True
+        ):
+            piece = chunk['choices'][0]['text']
+            if not piece:
+                continue
+            if first is None:
+                first = time.perf_counter()
+                piece = piece.lstrip()
+            pieces.append(piece)
+            if stats is not None:
+                stats.update(self._stream_stats(start, first, len(pieces)))
+            yield piece
+
+        session.turns.append((user_input, "".join(pieces).strip()))
+        session.state = self._compact_state()
+        session.model = self.model_path
+        if stats is not None:
+            stats.update(self._stream_stats(start, first, len(pieces)))
+            stats.update({"prompt_tokens": len(tokens), "reused_tokens": reused,
+                          "turns": len(session.turns), "dropped_turns": session.dropped_turns})
+
+    def chat(self, session, user_input, stats=None):
+        """Non-streaming stream_chat."""
+        return "".join(self.stream_chat(session, user_input, stats=stats)).strip()
+
+    @staticmethod
+    def _stream_stats(start, first, tokens):
+        total = time.perf_counter() - start
+        decode = total - (first - start) if first else 0.0
+        return {
+            "ttft_ms": round((first - start) * 1000, 1) if first else None,
+            "tokens": tokens,
+            "total_s": round(total, 3),
+            # Decode speed after the first token (prompt processing excluded)
+            "tokens_per_sec": round((tokens - 1) / decode, 2) if tokens > 1 and decode > 0 else 0.0,
+        }
+
+    def _next_token_logprobs(self, tokens):
+        """
+        Evaluates 'tokens', reusing whatever matching prefix is already in the
+        KV cache, and returns the log-probabilities of the next token.
+        """
+        # Keep at least the last token to re-evaluate, so its logits are fresh
+        limit = min(self.llm.n_tokens, len(tokens) - 1)
+        mismatch = np.nonzero(self.llm.input_ids[:limit] != np.asarray(tokens[:limit]))[0]
+        self.llm.n_tokens = int(mismatch[0]) if len(mismatch) else limit
+        self.llm.eval(tokens[self.llm.n_tokens:])
+
+        # Logits of the last evaluated token (llm.scores is only filled with logits_all=True)
+        logits = np.ctypeslib.as_array(llama_cpp.llama_get_logits(self.llm.ctx), shape=(self.llm.n_vocab(),))
+        logits = logits.astype(np.float64)
+        m = logits.max()
+        return logits - (m + np.log(np.exp(logits - m).sum()))
+
+    def score_labels(self, prompt, labels):
+        """
+        Constrained greedy decoding over a fixed set of answers: walks the
+        labels' tokens like a trie, at each step keeping only the branch with
+        the highest log-probability. When the labels already differ at their
+        first token (true for the intent labels) this is a single forward pass
+        over the prompt and no sampling at all.
+        Returns (best_label, {label: log-prob of its distinguishing tokens}).
+        """
+        prompt_tokens = self.llm.tokenize(prompt.encode("utf-8"), special=True)
+        n = len(prompt_tokens)
+        paths = {}
+        for label in labels:
+            full = self.llm.tokenize((prompt + label).encode("utf-8"), special=True)
+            paths[label] = full[n:] if full[:n] == prompt_tokens else \
+                self.llm.tokenize(label.encode("utf-8"), add_bos=False, special=True)
+
+        scores = {label: 0.0 for label in labels}
+        candidates = list(labels)
+        depth = 0
+        longest = max(len(p) for p in paths.values())
+        while len(candidates) > 1 and depth <= longest: # Identical labels can't be split further
+            logprobs = self._next_token_logprobs(prompt_tokens + paths[candidates[0]][:depth])
+            branches = {}
+            for label in candidates:
+                path = paths[label]
+                # A label that ends here competes with the end-of-sequence token
+                token = path[depth] if depth < len(path) else self.llm.token_eos()
+                scores[label] += logprobs[token]
+                branches.setdefault(token, []).append(label)
+            candidates = max(branches.values(), key=lambda group: scores[group[0]])
+            depth += 1
+        return candidates[0], scores
+
+    def _get_intent_grammar(self):
+        if self._intent_grammar is None:
+            choices = " | ".join(f'"{label}"' for label in VALID_INTENTS)
+            self._intent_grammar = LlamaGrammar.from_string(f"root ::= {choices}", verbose=False)
+        return self._intent_grammar
+
+    def classify_intent(self, user_input, mode=None):
         """
         Determines the USER INTENT.
+        mode: "sample"  - free-form generation, then match the label in the text
+              "logprob" - score the four labels directly (see score_labels)
+              "grammar" - generation restricted by a llama.cpp grammar to the labels
         """
-        system_instruction = (
-            "You are a router. Classify the user query into EXACTLY one of these categories: "
-            "[DIAGNOSE_MACHINERY, CHECK_SCHEMES, MARKET_PRICE, GENERAL_CHAT]. "
-            "Do not explain. Reply ONLY with the category name."
-        )
-        
-        # Few-shot examples to help the small model understand
-        examples = (
-            "Examples:\n"
-            "User: My tractor engine is making a knocking sound.\nAssistant: DIAGNOSE_MACHINERY\n"
-            "User: Is there a subsidy for solar pumps?\nAssistant: CHECK_SCHEMES\n"
-            "User: What is the price of tomatoes today?\nAssistant: MARKET_PRICE\n"
-            "User: How are you?\nAssistant: GENERAL_CHAT\n"
-        )
-        
+        mode = mode or self.intent_mode
+
         # Combine instructions + examples + current query
-        final_query = f"{examples}\nUser: {user_input}"
-        prompt = self._format_prompt(final_query, system_instruction)
+        final_query = f"{ROUTER_EXAMPLES}\nUser: {user_input}"
+        prompt = self._format_prompt(final_query, ROUTER_INSTRUCTION)
+
+        # Only the user's text is evaluated; the router prompt comes from the cache
+        self._use_prefix(self._prompt_prefix(ROUTER_INSTRUCTION, f"{ROUTER_EXAMPLES}\nUser: "))
+
+        if mode == "logprob":
+            return self.score_labels(prompt, VALID_INTENTS)[0]
         
         output = self.llm(
             prompt, 
             max_tokens=15, # We only need a short label
             stop=["\n", "</s>"],
-            temperature=0.1 # Low temp = High precision
+            temperature=0.1, # Low temp = High precision
+            grammar=self._get_intent_grammar() if mode == "grammar" else None
         )
         
         intent = output['choices'][0]['text'].strip()
         
         # Validation/Fallback
-        valid_intents = ["DIAGNOSE_MACHINERY", "CHECK_SCHEMES", "MARKET_PRICE", "GENERAL_CHAT"]
-        
         # Simple cleanup in case model adds punctuation
-        for v in valid_intents:
+        for v in VALID_INTENTS:
             if v in intent:
                 return v
                 
@@ -106,12 +361,42 @@ if __name__ == "__main__":
         q1 = "My water pump is making a weird noise."
         print(f"Q: {q1}")
         print(f"Intent: {brain.classify_intent(q1)}")
+
+        # Test 1b: Prefix cache (router prompt is evaluated only once)
+        for q in ["Is there a subsidy for drip irrigation?", "Onion rate in Nashik mandi?"]:
+            start = time.perf_counter()
+            intent = brain.classify_intent(q)
+            print(f"Intent: {intent} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        print(f"[Brain] Prefix cache: {brain.prefix_stats}")
+
+        # Test 1c: Constrained intent modes
+        for mode in ["sample", "grammar", "logprob"]:
+            start = time.perf_counter()
+            intent = brain.classify_intent(q1, mode=mode)
+            print(f"Intent ({mode}): {intent} ({(time.perf_counter() - start) * 1000:.0f} ms)")
         
         # Test 2: General Conversation
         print("\n--- Testing Response ---")
         q2 = "Why should I use organic fertilizer?"
         print(f"Q: {q2}")
         print(f"A: {brain.generate_response(q2)}")
+
+        # Test 3: Streaming
+        print("\n--- Testing Stream ---")
+        stats = {}
+        for piece in brain.stream_response(q2, stats=stats):
+            print(piece, end="", flush=True)
+        print(f"\n[Brain] {stats}")
+
+        # Test 4: Multi-turn session (follow-ups only evaluate the new question)
+        print("\n--- Testing Session ---")
+        from intelligence.mod_chat_session import ChatSession
+        session = ChatSession("demo")
+        for q in ["My wheat leaves have orange spots.", "Which spray should I use for it?", "How often?"]:
+            stats = {}
+            print(f"Q: {q}\nA: {brain.chat(session, q, stats=stats)}")
+            print(f"[Brain] prompt {stats['prompt_tokens']} tokens, reused {stats['reused_tokens']}, "
+                  f"ttft {stats['ttft_ms']} ms")
         
     except Exception as e:
         print(f"Error: {e}")
\ No newline at end of file
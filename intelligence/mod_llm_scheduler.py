@@ -0,0 +1,216 @@
+import time
+import queue
+import uuid
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, CancelledError
+
+# Lower runs first. Intent classification is a few tokens, generation is hundreds.
+PRIORITY_INTENT = 0
+PRIORITY_CHAT = 10
+PRIORITY_BACKGROUND = 20
+
+_DONE = object()
+
+class LLMTicket:
+    def __init__(self, priority, seq, method, args, kwargs, deadline, stream):
+        """One queued call. result() blocks for it; cancel() drops it if it hasn't run yet
+        (or stops a stream at the next token)."""
+        self.id = uuid.uuid4().hex[:12]
+        self.priority = priority
+        self.seq = seq  # FIFO within a priority
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.future = Future()
+        self.pieces = queue.Queue() if stream else None
+        self.cancelled = threading.Event()
+        self.enqueued = time.perf_counter()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def expired(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+class LLMScheduler:
+    def __init__(self, engine, name="llama", history=500):
+        """
+        Owns a LlamaEngine and runs every call on one worker thread, since a
+        llama-cpp Llama must not be used by two threads at once. Waiting calls
+        are ordered by priority, so an intent classification queued behind
+        three chat answers runs next. A call that is already generating is
+        not interrupted (the KV cache belongs to it until it finishes).
+
+        deadline (seconds) is checked before a call starts and between
+        streamed tokens; an expired call raises TimeoutError.
+        Exposes the same methods as LlamaEngine, so it is a drop-in.
+        """
+        self.engine = engine
+        self.name = name
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._waiting = {}  # priority -> queued count
+        self._waits = deque(maxlen=history)  # (priority, wait ms)
+        self._runs = deque(maxlen=history)  # run ms
+        self.counts = {"completed": 0, "failed": 0, "cancelled": 0, "expired": 0}
+        self.running = None
+        self._thread = threading.Thread(target=self._worker, name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, method, *args, priority=PRIORITY_CHAT, deadline=None, stream=False, **kwargs):
+        """Queues engine.<method>(*args, **kwargs). Returns an LLMTicket."""
+        if self.engine is None:
+            raise RuntimeError(f"Scheduler '{self.name}' is closed.")
+        ticket = LLMTicket(priority, next(self._seq), method, args, kwargs,
+                           time.perf_counter() + deadline if deadline else None, stream)
+        with self._lock:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+        self._queue.put(ticket)
+        return ticket
+
+    def _worker(self):
+        while True:
+            ticket = self._queue.get()
+            if ticket.method is None:  # close() sentinel
+                self.engine = None
+                return
+            with self._lock:
+                self._waiting[ticket.priority] -= 1
+            if ticket.cancelled.is_set():
+                self._finish(ticket, "cancelled", CancelledError())
+                continue
+            if ticket.expired():
+                self._finish(ticket, "expired", TimeoutError(f"LLM call '{ticket.method}' expired in the queue."))
+                continue
+
+            wait_ms = (time.perf_counter() - ticket.enqueued) * 1000
+            start = time.perf_counter()
+            with self._lock:
+                self._waits.append((ticket.priority, wait_ms))
+                self.running = {"method": ticket.method, "priority": ticket.priority, "started": time.time()}
+            try:
+                fn = getattr(self.engine, ticket.method)
+                if ticket.pieces is None:
+                    self._finish(ticket, "completed", result=fn(*ticket.args, **ticket.kwargs))
+                else:
+                    self._run_stream(ticket, fn)
+            except Exception as e:
+                self._finish(ticket, "failed", e)
+            with self._lock:
+                self._runs.append((time.perf_counter() - start) * 1000)
+                self.running = None
+
+    def _run_stream(self, ticket, fn):
+        gen = fn(*ticket.args, **ticket.kwargs)
+        try:
+            for piece in gen:
+                if ticket.cancelled.is_set():
+                    self._finish(ticket, "cancelled", CancelledError())
+                    return
+                if ticket.expired():
+                    self._finish(ticket, "expired", TimeoutError(f"LLM call '{ticket.method}' ran past its deadline."))
+                    return
+                ticket.pieces.put(piece)
+        finally:
+            gen.close()
+        self._finish(ticket, "completed")
+
+    def _finish(self, ticket, outcome, error=None, result=None):
+        with self._lock:
+            self.counts[outcome] += 1
+        if error is None:
+            ticket.future.set_result(result)
+        else:
+            ticket.future.set_exception(error)
+        if ticket.pieces is not None:
+            ticket.pieces.put(_DONE if error is None else error)
+
+    def _iter_pieces(self, ticket):
+        try:
+            while True:
+                item = ticket.pieces.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            ticket.cancel()  # Consumer went away (e.g. client disconnected): stop generating
+
+    # --- LlamaEngine drop-in ---
+
+    def classify_intent(self, user_input, mode=None, deadline=None):
+        return self.submit("classify_intent", user_input, mode=mode, priority=PRIORITY_INTENT, deadline=deadline).result()
+
+    def score_labels(self, prompt, labels, deadline=None):
+        return self.submit("score_labels", prompt, labels, priority=PRIORITY_INTENT, deadline=deadline).result()
+
+    def generate_response(self, user_input, context="", priority=PRIORITY_CHAT, deadline=None):
+        return self.submit("generate_response", user_input, context, priority=priority, deadline=deadline).result()
+
+    def chat(self, session, user_input, stats=None, priority=PRIORITY_CHAT, deadline=None):
+        return self.submit("chat", session, user_input, stats=stats, priority=priority, deadline=deadline).result()
+
+    def stream_response(self, user_input, context="", stats=None, priority=PRIORITY_CHAT, deadline=None):
+        return self._iter_pieces(self.submit("stream_response", user_input, context, stats=stats,
+                                             priority=priority, deadline=deadline, stream=True))
+
+    def stream_chat(self, session, user_input, stats=None, priority=PRIORITY_CHAT, deadline=None):
+        return self._iter_pieces(self.submit("stream_chat", session, user_input, stats=stats,
+                                             priority=priority, deadline=deadline, stream=True))
+
+    def close(self):
+        """Lets queued calls finish, then releases the engine (used by ModelHub on eviction)."""
+        sentinel = LLMTicket(float("inf"), next(self._seq), None, (), {}, None, False)
+        self._queue.put(sentinel)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(ms for _, ms in self._waits)
+            runs = sorted(self._runs)
+            by_priority = {}
+            for priority, ms in self._waits:
+                by_priority.setdefault(priority, []).append(ms)
+            return {
+                "queue_depth": sum(self._waiting.values()),
+                "waiting": {str(p): n for p, n in sorted(self._waiting.items()) if n},
+                "running": self.running,
+                **self.counts,
+                "wait_ms_median": round(waits[len(waits) // 2], 1) if waits else 0.0,
+                "wait_ms_p95": round(waits[int(len(waits) * 0.95)], 1) if waits else 0.0,
+                "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+                "wait_ms_mean_by_priority": {str(p): round(sum(v) / len(v), 1) for p, v in sorted(by_priority.items())},
+                "run_ms_median": round(runs[len(runs) // 2], 1) if runs else 0.0,
+            }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m intelligence.mod_llm_scheduler
+    from intelligence.mod_llama_brain import LlamaEngine
+
+    llm = LLMScheduler(LlamaEngine())
+
+    # Three long answers queue up, then an intent query arrives: it runs second, not fourth
+    answers = [llm.submit("generate_response", q) for q in
+               ["Why use organic fertilizer?", "How to store onions?", "When to sow wheat?"]]
+    start = time.perf_counter()
+    intent = llm.classify_intent("My tractor is making a knocking sound.")
+    print(f"Intent: {intent} after {(time.perf_counter() - start):.1f}s")
+
+    answers[-1].cancel()  # Still queued: never runs
+    for ticket in answers:
+        try:
+            print(f"A: {ticket.result()[:60]}...")
+        except CancelledError:
+            print("A: (cancelled)")
+    print(llm.stats())
@@ -1,21 +1,40 @@
-import chromadb
 from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
 import os
+import threading
+
+from intelligence.mod_keyword_index import BM25Index, reciprocal_rank_fusion
+from intelligence.mod_vector_index import open_index
 
 class RAGStore:
-    def __init__(self, persist_dir="./knowledge_db"):
+    def __init__(self, persist_dir="./knowledge_db", query_cache_size=1024, backend=None):
+        """
+        backend: "chroma" (default), "numpy" (memory-mapped float16) or
+        "numpy-int8". Also settable with the KARYA_RAG_BACKEND variable.
+        """
         print("[RAG] Initializing Offline Knowledge Base...")
+        self.persist_dir = persist_dir
+        self.backend = backend or os.environ.get("KARYA_RAG_BACKEND", "chroma")
+
+        # Query text -> embedding (LRU). Popular questions skip the encoder.
+        # One store serves every Flask thread, so the LRU is only touched under the lock.
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_size = query_cache_size
+        self.query_cache_stats = {"hits": 0, "misses": 0}
+
+        # BM25 keyword index, built lazily from the collection
+        self._bm25 = None
         
         # 1. Embedding Model (Converts text to numbers)
         # 'all-MiniLM-L6-v2' is tiny (80MB) and fast on CPU
         self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
         
         # 2. Vector Database (Stores the numbers)
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        self.collection = self.client.get_or_create_collection(name="farm_manuals")
+        self.index = open_index(self.backend, persist_dir, name="farm_manuals")
         
         # Check if empty, and load seed data if needed
-        if self.collection.count() == 0:
+        if self.index.count() == 0:
             self._seed_knowledge()
 
     def _seed_knowledge(self):
@@ -42,33 +61,101 @@ class RAGStore:
         ids = [f"doc_{i}" for i in range(len(documents))]
         
         # Embed and Add to DB
-        embeddings = self.encoder.encode(documents).tolist()
-        self.collection.add(
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        embeddings = self.encoder.encode(documents)
+        self.index.add(ids, embeddings, documents, metadatas)
+        self.index.flush()
+        self._bm25 = None
         print(f"[RAG] Ingested {len(documents)} documents.")
 
+    def ingest(self, paths, batch_size=64, **kwargs):
+        """
+        Bulk-loads PDFs / text files (or directories of them) into 'farm_manuals'.
+        Unchanged files are skipped by content hash. See mod_doc_ingest.
+        """
+        from intelligence.mod_doc_ingest import DocIngestor
+        stats = DocIngestor(self, batch_size=batch_size, **kwargs).ingest(paths)
+        self._bm25 = None # Rebuilt on next search
+        return stats
+
+    def _embed_query(self, query):
+        key = " ".join(query.lower().split())
+        with self._query_cache_lock:
+            emb = self._query_cache.get(key)
+            if emb is not None:
+                self._query_cache.move_to_end(key)
+                self.query_cache_stats["hits"] += 1
+                return emb
+            self.query_cache_stats["misses"] += 1
+        emb = self.encoder.encode([query])[0].tolist()  # Outside the lock: encoding is the slow part
+        with self._query_cache_lock:
+            self._query_cache[key] = emb
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return emb
+
+    def _keyword_index(self):
+        if self._bm25 is None:
+            ids, documents, _ = self.index.get()
+            self._bm25 = BM25Index()
+            self._bm25.add(ids, documents)
+            print(f"[RAG] Keyword index built over {len(self._bm25)} chunks.")
+        return self._bm25
+
+    def search(self, query, k=3, mode="hybrid", candidates=20):
+        """
+        Top-k search. mode: "hybrid" (BM25 + vector, fused by reciprocal rank),
+        "vector" or "keyword". Returns a list of dicts best first:
+        {id, document, source, score, vector_rank, keyword_rank}.
+        """
+        total = self.index.count()
+        if total == 0:
+            return []
+        pool = min(max(candidates, k), total)
+
+        vector_ids, docs, metas = [], {}, {}
+        if mode in ("hybrid", "vector"):
+            for doc_id, doc, meta, _ in self.index.query(self._embed_query(query), pool):
+                vector_ids.append(doc_id)
+                docs[doc_id] = doc
+                metas[doc_id] = meta
+
+        keyword_ids = []
+        if mode in ("hybrid", "keyword"):
+            keyword_ids = [doc_id for doc_id, _ in self._keyword_index().search(query, pool)]
+
+        fused = reciprocal_rank_fusion([r for r in (vector_ids, keyword_ids) if r])[:k]
+
+        # Fetch text for keyword-only hits
+        missing = [doc_id for doc_id, _ in fused if doc_id not in docs]
+        if missing:
+            got_ids, got_docs, got_metas = self.index.get(ids=missing)
+            docs.update(zip(got_ids, got_docs))
+            metas.update(zip(got_ids, got_metas))
+
+        return [
+            {
+                "id": doc_id,
+                "document": docs[doc_id],
+                "source": (metas.get(doc_id) or {}).get("source", "Unknown"),
+                "score": round(score, 5),
+                "vector_rank": vector_ids.index(doc_id) + 1 if doc_id in vector_ids else None,
+                "keyword_rank": keyword_ids.index(doc_id) + 1 if doc_id in keyword_ids else None,
+            }
+            for doc_id, score in fused
+        ]
+
     def retrieve(self, query, n_results=1):
         """
-        Semantic Search: Finds the most relevant manual entry.
+        Hybrid Search: Finds the most relevant manual entries.
         """
-        query_emb = self.encoder.encode([query]).tolist()
+        hits = self.search(query, k=n_results)
         
-        results = self.collection.query(
-            query_embeddings=query_emb,
-            n_results=n_results
-        )
-        
-        if not results['documents'][0]:
+        if not hits:
             return "No relevant manual found."
             
-        # Return the text content of the best match
-        best_doc = results['documents'][0][0]
-        source = results['metadatas'][0][0]['source']
-        return f"{best_doc} (Source: {source})"
+        # Return the text content of the best matches
+        return "\n\n".join(f"{h['document']} (Source: {h['source']})" for h in hits)
 
 # --- Test Block ---
 if __name__ == "__main__":
@@ -81,4 +168,9 @@ if __name__ == "__main__":
     
     user_query_2 = "What is the symptom of wheat rust?"
     print(f"\nUser: {user_query_2}")
-    print(f"Retrieved: {kb.retrieve(user_query_2)}")
\ No newline at end of file
+    print(f"Retrieved: {kb.retrieve(user_query_2)}")
+
+    # Test: Exact scheme name (keyword side of the hybrid search)
+    for hit in kb.search("PM-Kisan installments", k=2):
+        print(hit)
+    print(f"Query cache: {kb.query_cache_stats}")
\ No newline at end of file
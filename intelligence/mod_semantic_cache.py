@@ -0,0 +1,189 @@
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+
+class SemanticCache:
+    def __init__(self, encoder=None, db_path="semantic_cache.db", threshold=0.85,
+                 ttl_seconds=7 * 24 * 3600, max_entries=2000):
+        """
+        Answer cache keyed by meaning instead of exact text. A question is
+        embedded and compared (cosine) against earlier questions; above
+        'threshold' the stored answer is returned without calling the LLM.
+
+        encoder: a SentenceTransformer, or a zero-argument callable returning
+                 one (e.g. lambda: hub.get('rag').encoder), so the model is
+                 shared and only loaded on first use.
+        scope: passed to lookup/put, keeps answers from different models or
+               contexts apart (only questions in the same scope can match).
+        Entries expire after ttl_seconds; beyond max_entries the least
+        recently used are dropped. Rows live in SQLite, so the cache
+        survives restarts; embeddings are also kept in RAM for the lookup.
+        """
+        self._encoder = encoder
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_embedding = None
+        self._lock = threading.Lock()
+        self._create_table()
+        self._load()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _create_table(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT,
+                question TEXT,
+                embedding BLOB,
+                answer TEXT,
+                created REAL,
+                last_access REAL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _load(self):
+        """Reads all live rows into RAM: ids, scopes and an (N, dim) matrix."""
+        conn = self._connect()
+        rows = conn.execute('SELECT id, scope, embedding FROM answers WHERE created >= ?',
+                            (time.time() - self.ttl_seconds,)).fetchall()
+        conn.close()
+        self._ids = [r[0] for r in rows]
+        self._scopes = np.array([r[1] for r in rows], dtype=object)
+        self._matrix = np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows]) if rows else None
+
+    def _get_encoder(self):
+        if self._encoder is not None and not hasattr(self._encoder, "encode"):
+            self._encoder = self._encoder()  # Lazy factory
+        return self._encoder
+
+    def _embed(self, question):
+        text = " ".join(question.lower().split())
+        last = self._last_embedding  # A miss is usually followed by put() of the same question
+        if last and last[0] == text:
+            return last[1]
+        emb = self._get_encoder().encode([text], normalize_embeddings=True)[0].astype(np.float32)
+        self._last_embedding = (text, emb)
+        return emb
+
+    def lookup(self, question, scope="", embedding=None):
+        """Returns {"answer", "question", "similarity"} for the closest earlier question, or None."""
+        emb = self._embed(question) if embedding is None else embedding
+        best = None
+        with self._lock:
+            if self._matrix is not None:
+                sims = self._matrix @ emb
+                sims[self._scopes != scope] = -1.0
+                i = int(np.argmax(sims))
+                if sims[i] >= self.threshold:
+                    best = (self._ids[i], float(sims[i]))
+
+        row = None
+        if best:
+            conn = self._connect()
+            row = conn.execute('SELECT question, answer, created FROM answers WHERE id = ?', (best[0],)).fetchone()
+            if row and row[2] >= time.time() - self.ttl_seconds:
+                conn.execute('UPDATE answers SET last_access = ?, hits = hits + 1 WHERE id = ?', (time.time(), best[0]))
+                conn.commit()
+            else:
+                row = None  # Expired since it was loaded
+            conn.close()
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return {"answer": row[1], "question": row[0], "similarity": round(best[1], 4)} if row else None
+
+    def put(self, question, answer, scope="", embedding=None):
+        emb = self._embed(question) if embedding is None else embedding
+        now = time.time()
+        conn = self._connect()
+        conn.execute('''
+            INSERT INTO answers (scope, question, embedding, answer, created, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (scope, question, emb.astype(np.float32).tobytes(), answer, now, now))
+        self._evict(conn, now)
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._load()
+
+    def _evict(self, conn, now):
+        """Drops expired rows, then least-recently-used rows beyond max_entries."""
+        expired = conn.execute('DELETE FROM answers WHERE created < ?', (now - self.ttl_seconds,)).rowcount
+        over = conn.execute('SELECT COUNT(*) FROM answers').fetchone()[0] - self.max_entries
+        if over > 0:
+            conn.execute('DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_access ASC LIMIT ?)', (over,))
+        with self._lock:
+            self.evictions += expired + max(over, 0)
+
+    def get_or_generate(self, question, generate, scope=""):
+        """
+        Cache-aside helper. generate() only runs on a miss, and its answer is
+        stored only if it returns normally (so fallbacks are never cached).
+        Returns (answer, hit).
+        """
+        emb = self._embed(question)
+        hit = self.lookup(question, scope, embedding=emb)
+        if hit:
+            return hit["answer"], True
+        answer = generate()
+        self.put(question, answer, scope, embedding=emb)
+        return answer, False
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM answers')
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._load()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._ids),
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+            }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+
+    cache = SemanticCache(encoder=SentenceTransformer('all-MiniLM-L6-v2'), db_path="test_semantic_cache.db")
+
+    def slow_llm():
+        time.sleep(1.0)
+        return "Spray propiconazole 25 EC (1 ml per litre of water) at the first sign of rust."
+
+    for q in ["How to treat wheat rust?", "wheat rust medicine", "What is the price of onions?"]:
+        start = time.perf_counter()
+        hit = cache.lookup(q)
+        answer = hit["answer"] if hit else slow_llm()
+        if not hit:
+            cache.put(q, answer)
+        print(f"Q: {q} -> {'HIT ' + str(hit['similarity']) if hit else 'MISS'} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(cache.stats())
+
+    os.remove("test_semantic_cache.db")
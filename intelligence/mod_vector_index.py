@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from utility.mod_memmap import grow_npy, grown_capacity
+
+class ChromaIndex:
+    def __init__(self, persist_dir, name="farm_manuals"):
+        """The original backend: a Chroma persistent collection."""
+        import chromadb
+        self.dir = persist_dir
+        self.client = chromadb.PersistentClient(path=persist_dir)
+        self.collection = self.client.get_or_create_collection(name=name)
+
+    def count(self):
+        return self.collection.count()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(ids=ids, embeddings=np.asarray(embeddings).tolist(),
+                            documents=documents, metadatas=metadatas)
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def query(self, embedding, k):
+        """Returns [(id, document, metadata, similarity), ...] best first."""
+        res = self.collection.query(query_embeddings=[np.asarray(embedding, dtype=np.float32).tolist()], n_results=k)
+        return [
+            (i, d, m, 1.0 - dist / 2) # Squared L2 of unit vectors = 2 - 2 * cosine
+            for i, d, m, dist in zip(res['ids'][0], res['documents'][0], res['metadatas'][0], res['distances'][0])
+        ]
+
+    def get(self, ids=None):
+        res = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return res['ids'], res['documents'], res['metadatas']
+
+    def flush(self):
+        pass
+
+class NumpyIndex:
+    def __init__(self, persist_dir, name="farm_manuals", quantize="float16", block_rows=512):
+        """
+        Lightweight exact-search index for edge devices.
+        <name>.vectors.npy  memory-mapped matrix, float16 or int8 (+ per-row scale)
+        <name>.meta.jsonl   one {"id", "document", "metadata"} line per row
+        <name>.index.json   row count, dimension, dtype
+        Opening only maps the files, so startup is near-instant and the OS
+        pages vectors in on demand. Search is a blocked dot product plus
+        argpartition (embeddings are L2-normalized, so dot = cosine).
+        """
+        self.dir = persist_dir
+        self.name = name
+        self.block_rows = block_rows
+        os.makedirs(persist_dir, exist_ok=True)
+        self.vectors_path = os.path.join(persist_dir, f"{name}.vectors.npy")
+        self.scales_path = os.path.join(persist_dir, f"{name}.scales.npy")
+        self.meta_path = os.path.join(persist_dir, f"{name}.meta.jsonl")
+        self.header_path = os.path.join(persist_dir, f"{name}.index.json")
+
+        self.header = {"count": 0, "dim": None, "quantize": quantize}
+        if os.path.exists(self.header_path):
+            with open(self.header_path) as f:
+                self.header = json.load(f)
+        self.quantize = self.header["quantize"]
+
+        self._vectors = None
+        self._scales = None
+        self._open_arrays()
+
+        # Row -> id and byte offset into the JSONL (documents are read lazily)
+        self.ids, self.offsets = [], []
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "rb") as f:
+                pos = 0
+                for line in f:
+                    self.ids.append(json.loads(line)["id"])
+                    self.offsets.append(pos)
+                    pos += len(line)
+            n = self.header["count"]
+            if len(self.ids) > n:
+                # An append interrupted before the header was saved: drop its meta lines too,
+                # or the next append would land after them and rows would misalign
+                with open(self.meta_path, "r+b") as f:
+                    f.truncate(self.offsets[n])
+                del self.ids[n:], self.offsets[n:]
+            elif len(self.ids) < n:
+                self.header["count"] = len(self.ids)
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def _open_arrays(self):
+        if os.path.exists(self.vectors_path):
+            self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+            if self.quantize == "int8":
+                self._scales = np.load(self.scales_path, mmap_mode="r+")
+
+    def _grow(self, needed, dim):
+        """Doubles the mapped capacity (amortized O(1) appends)."""
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = grown_capacity(needed, capacity, minimum=1024)
+        dtype = np.int8 if self.quantize == "int8" else np.float16
+        n = self.header["count"]
+        grow_npy(self.vectors_path, self._vectors, n, new_capacity, dtype, (dim,))
+        if self.quantize == "int8":
+            grow_npy(self.scales_path, self._scales, n, new_capacity, np.float32)
+        self._vectors = self._scales = None
+        self._open_arrays()
+
+    def _save_header(self):
+        with open(self.header_path + ".tmp", "w") as f:
+            json.dump(self.header, f)
+        os.replace(self.header_path + ".tmp", self.header_path)
+
+    def count(self):
+        return self.header["count"]
+
+    def add(self, ids, embeddings, documents, metadatas):
+        emb = np.array(embeddings, dtype=np.float32)  # A copy: normalizing must not touch the caller's array
+        emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+        existing = [doc_id for doc_id in ids if doc_id in self.row_of]
+        if existing:
+            self.delete(ids=existing)
+
+        n = self.header["count"]
+        self.header["dim"] = self.header["dim"] or emb.shape[1]
+        self._grow(n + len(ids), self.header["dim"])
+
+        if self.quantize == "int8":
+            scale = np.maximum(np.abs(emb).max(axis=1), 1e-12) / 127.0
+            self._vectors[n:n + len(ids)] = np.round(emb / scale[:, None]).astype(np.int8)
+            self._scales[n:n + len(ids)] = scale
+        else:
+            self._vectors[n:n + len(ids)] = emb.astype(np.float16)
+
+        with open(self.meta_path, "ab") as f:
+            pos = f.tell()
+            for doc_id, doc, meta in zip(ids, documents, metadatas):
+                line = (json.dumps({"id": doc_id, "document": doc, "metadata": meta}) + "\n").encode("utf-8")
+                f.write(line)
+                self.row_of[doc_id] = len(self.ids)
+                self.ids.append(doc_id)
+                self.offsets.append(pos)
+                pos += len(line)
+
+        self.header["count"] = n + len(ids)
+        self._save_header()
+
+    def _read_rows(self, rows):
+        out = []
+        with open(self.meta_path, "rb") as f:
+            for row in rows:
+                f.seek(self.offsets[row])
+                out.append(json.loads(f.readline()))
+        return out
+
+    def delete(self, ids=None, where=None):
+        """Removes rows by id or by metadata equality, then compacts the files."""
+        n = self.header["count"]
+        doomed = {self.row_of[i] for i in (ids or []) if i in self.row_of}
+        if where:
+            for row, rec in enumerate(self._read_rows(range(n))):
+                if all(rec["metadata"].get(k) == v for k, v in where.items()):
+                    doomed.add(row)
+        if not doomed:
+            return
+        keep = [row for row in range(n) if row not in doomed]
+        records = self._read_rows(keep)
+        self._vectors[:len(keep)] = self._vectors[keep]
+        if self.quantize == "int8":
+            self._scales[:len(keep)] = self._scales[keep]
+
+        with open(self.meta_path + ".tmp", "wb") as f:
+            for rec in records:
+                f.write((json.dumps(rec) + "\n").encode("utf-8"))
+        os.replace(self.meta_path + ".tmp", self.meta_path)
+
+        self.ids = [rec["id"] for rec in records]
+        self.offsets, pos = [], 0
+        for rec in records:
+            self.offsets.append(pos)
+            pos += len((json.dumps(rec) + "\n").encode("utf-8"))
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.header["count"] = len(keep)
+        self._save_header()
+
+    def query(self, embedding, k):
+        n = self.header["count"]
+        if n == 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        q = q / max(np.linalg.norm(q), 1e-12)
+
+        # Blocked so float16/int8 rows are widened to float32 a slice at a time
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, self.block_rows):
+            block = self._vectors[start:min(start + self.block_rows, n)]
+            scores[start:start + len(block)] = block.astype(np.float32) @ q
+        if self.quantize == "int8":
+            scores *= self._scales[:n]
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        records = self._read_rows(top)
+        return [(r["id"], r["document"], r["metadata"], float(scores[row])) for r, row in zip(records, top)]
+
+    def get(self, ids=None):
+        rows = range(self.header["count"]) if ids is None else [self.row_of[i] for i in ids if i in self.row_of]
+        records = self._read_rows(rows)
+        return [r["id"] for r in records], [r["document"] for r in records], [r["metadata"] for r in records]
+
+    def flush(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+def open_index(backend, persist_dir, name="farm_manuals"):
+    """backend: "chroma", "numpy" (float16) or "numpy-int8"."""
+    if backend == "chroma":
+        return ChromaIndex(persist_dir, name)
+    if backend in ("numpy", "numpy-float16"):
+        return NumpyIndex(os.path.join(persist_dir, "numpy"), name, quantize="float16")
+    if backend == "numpy-int8":
+        return NumpyIndex(os.path.join(persist_dir, "numpy_int8"), name, quantize="int8")
+    raise ValueError(f"Unknown index backend '{backend}'.")
+
+# --- Benchmark ---
+
+def _probe(backend, persist_dir, dim, queries=50):
+    """Runs in a fresh interpreter: import + open time, RSS, query latency."""
+    from utility.mod_model_hub import current_rss_mb
+    rss_start = current_rss_mb()
+    start = time.perf_counter()
+    index = open_index(backend, persist_dir)
+    open_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    times = []
+    for _ in range(queries):
+        q = rng.standard_normal(dim).astype(np.float32)
+        t = time.perf_counter()
+        index.query(q / np.linalg.norm(q), 5)
+        times.append((time.perf_counter() - t) * 1000)
+    times.sort()
+    print(json.dumps({
+        "backend": backend, "count": index.count(), "startup_s": round(open_s, 3),
+        "rss_mb": round(current_rss_mb() - rss_start, 1),
+        "query_median_ms": round(times[len(times) // 2], 2), "query_p95_ms": round(times[int(len(times) * 0.95)], 2),
+    }))
+
+def benchmark(n=20000, dim=384, persist_dir="bench_index", backends=("chroma", "numpy", "numpy-int8")):
+    """Fills each backend with n random unit vectors, then probes each in its own process."""
+    import subprocess
+    rng = np.random.default_rng(0)
+    emb = rng.standard_normal((n, dim)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    ids = [f"chunk_{i}" for i in range(n)]
+    docs = [f"Synthetic manual chunk number {i}." for i in range(n)]
+    metas = [{"source": "bench"} for _ in range(n)]
+
+    for backend in backends:
+        index = open_index(backend, persist_dir)
+        if index.count() < n:
+            for s in range(0, n, 4096):
+                index.add(ids[s:s + 4096], emb[s:s + 4096], docs[s:s + 4096], metas[s:s + 4096])
+            index.flush()
+        del index
+        out = subprocess.run([sys.executable, "-m", "intelligence.mod_vector_index", "_probe", backend, persist_dir, str(dim)],
+                             capture_output=True, text=True)
+        print(out.stdout.strip().splitlines()[-1] if out.stdout.strip() else out.stderr.strip()[-300:])
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m intelligence.mod_vector_index [n_chunks]
+    if len(sys.argv) > 1 and sys.argv[1] == "_probe":
+        _probe(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        benchmark(n=int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
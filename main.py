@@ -2,17 +2,20 @@ import os
 import sys
 import time
 
+# The menu runs one tool at a time, so each engine may use every core (see mod_thread_budget)
+os.environ.setdefault("KARYA_CONCURRENT_ENGINES", "0")
+
 # --- IMPORTING MODULES ---
 # We wrap imports in try-except blocks to prevent crashing if a module is missing
 try:
     # Module 1: IO & Diagnostics
-    from diagnostic import mod_voice_local, mod_airgap_courier, mod_machinery_hear
+    from diagnostic import mod_voice_local, mod_airgap_courier, mod_machinery_hear, mod_engine_stream, mod_audio_ingest
     
     # Module 2: Intelligence
     from intelligence import mod_llama_brain, mod_rag_store
     
     # Module 3: Vision
-    from agri import mod_crop_doctor, mod_inventory_cam, mod_quality_grader
+    from agri import mod_crop_doctor, mod_inventory_cam, mod_quality_grader, mod_conveyor_grader
     
     # Module 4: Business
     from business import mod_contract_maker, mod_khata_ledger, mod_rental_scheduler, mod_barter_match
@@ -68,6 +71,7 @@ def menu_diagnostics():
         print("1. Voice Interface (Transcribe Audio File)")
         print("2. Air-Gap Courier (Scan/Generate QR)")
         print("3. Tractor Doctor (Diagnose Engine Audio)")
+        print("4. Live Engine Monitor (Microphone or WAV Stream)")
         print("0. Back to Main Menu")
         
         choice = input("\nSelect Option: ")
@@ -80,7 +84,8 @@ def menu_diagnostics():
                 # We assume we modified the class to accept a file, or we mock it here:
                 # For strict adherence to the previous script, we might need to access the internal model directly
                 print("Processing...")
-                result = bot.stt_model.transcribe(f)
+                audio, _ = mod_audio_ingest.load_audio(f, mod_audio_ingest.WHISPER_RATE)
+                result = bot.stt_model.transcribe(audio)
                 print(f"\n💬 Transcription: {result['text']}")
                 input("\nPress Enter to continue...")
 
@@ -113,15 +118,30 @@ def menu_diagnostics():
             print("\n--- TRACTOR DOCTOR ---")
             f = get_file_input(['.wav'])
             if f:
-                import librosa
-                # Load the audio file and process
+                # The whole recording, in overlapping ~1.9s windows
                 doc = mod_machinery_hear.TractorDoctor()
-                audio, _ = librosa.load(f, sr=22050, duration=3) # Load 3s
-                
-                # Mocking the live record function by passing loaded audio directly
-                # Note: You might need to adjust the class to accept raw array if not already
-                diagnosis, conf = doc.diagnose(audio)
-                print(f"\n🚜 Diagnosis: {diagnosis} (Confidence: {conf:.2f})")
+                report = doc.diagnose_recording(f)
+                print(f"\n🚜 Diagnosis: {report['diagnosis']} (Confidence: {report['confidence']:.2f})")
+                print(f"   {report['duration_s']}s analysed in {report['windows']} windows")
+                for segment in report['segments']:
+                    print(f"   {segment['start_s']:6.2f}s - {segment['end_s']:6.2f}s  {segment['diagnosis']}")
+            input("\nPress Enter to continue...")
+
+        elif choice == '4':
+            print("\n--- LIVE ENGINE MONITOR ---")
+            print("Rev the engine near the microphone, or type a .wav path to replay a recording.")
+            path = input("WAV path (Enter = microphone, 15s): ").strip().strip('"')
+            doc = mod_machinery_hear.TractorDoctor()
+            live = mod_engine_stream.StreamingDiagnoser(doc, hop_seconds=0.5)
+            if path:
+                source = mod_engine_stream.wav_source(path, realtime=True)
+            else:
+                source = mod_engine_stream.mic_source(duration=15)
+            for result in live.stream(source):
+                print(f"\r🚜 {result['time_s']:6.1f}s  {result['diagnosis']:<14} ({result['confidence']:.2f})  "
+                      f"{result['latency_ms']:.0f} ms", end="", flush=True)
+            stats = live.stats()
+            print(f"\n{stats['windows']} windows, median latency {stats['latency_ms_median']} ms")
             input("\nPress Enter to continue...")
 
         elif choice == '0':
@@ -162,6 +182,8 @@ def menu_vision():
         print("1. Crop Doctor (Disease Detect from Photo)")
         print("2. Inventory Cam (Count Items in Photo)")
         print("3. Quality Grader (Grade Fruit in Photo)")
+        print("4. Conveyor Grader (Grade Fruit on a Belt Video)")
+        print("5. Inventory Cam (Count Items in a Shelf Video)")
         print("0. Back to Main Menu")
         
         choice = input("\nSelect Option: ")
@@ -187,8 +209,28 @@ def menu_vision():
             grader = mod_quality_grader.QualityGrader()
             f = get_file_input(['.jpg', '.jpeg', '.png'])
             if f:
-                res = grader.grade_fruit(f)
-                print(f"\n🍎 Grade: {res}")
+                tray = grader.grade_tray(f)
+                print(f"\n🍎 Grade: {tray['grade']}")
+                print(f"   {tray['fruits']} fruits: {tray['distribution']}")
+            input("Press Enter...")
+
+        elif choice == '4':
+            path = input("Video path (Enter = camera 0): ").strip().strip('"')
+            conveyor = mod_conveyor_grader.ConveyorGrader()
+            try:
+                for item in conveyor.run(path or 0):
+                    print(f"🍅 #{item['id']}: Grade {item['grade']}   Tally {item['tally']}")
+            except KeyboardInterrupt:
+                pass
+            print(f"\n📊 {conveyor.stats()}")
+            input("Press Enter...")
+
+        elif choice == '5':
+            path = input("Video path (Enter = camera 0): ").strip().strip('"')
+            target = input("Target object (e.g. 'apple', 'all'): ")
+            cam = mod_inventory_cam.InventoryCam()
+            summary = cam.count_video(path or 0, target_class=target)
+            print(f"\n🔢 Unique items: {summary['target']}   {summary['counts']}")
             input("Press Enter...")
             
         elif choice == '0':
@@ -0,0 +1,151 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class JobQueue:
+    def __init__(self, workers=None, max_pending=16, keep_seconds=600):
+        """
+        Runs heavy tools off the request thread.
+        workers: {queue_name: thread count}. Every queue gets its own pool, so
+                 a long Whisper transcription never blocks a YOLO count.
+        max_pending: per-queue limit on queued + running jobs (bounded backlog).
+        keep_seconds: finished jobs are forgotten after this long.
+        """
+        self.workers = workers or {"whisper": 1, "llama": 1, "yolo": 2}
+        self.max_pending = max_pending
+        self.keep_seconds = keep_seconds
+
+        self._pools = {
+            name: ThreadPoolExecutor(max_workers=n, thread_name_prefix=f"job-{name}")
+            for name, n in self.workers.items()
+        }
+        self._jobs = {}
+        self._pending = {name: 0 for name in self.workers}
+        self._cond = threading.Condition()
+
+    def submit(self, queue_name, fn, *args, owner=None, **kwargs):
+        """
+        Queues fn(*args, report=..., **kwargs) and returns the job id at once.
+        fn may call report(percent, message) to publish progress.
+        Raises RuntimeError if that queue's backlog is full.
+        """
+        if queue_name not in self._pools:
+            raise KeyError(f"Unknown job queue '{queue_name}'.")
+
+        with self._cond:
+            self._prune()
+            if self._pending[queue_name] >= self.max_pending:
+                raise RuntimeError(f"Job queue '{queue_name}' is full. Try again shortly.")
+            self._pending[queue_name] += 1
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "queue": queue_name,
+                "owner": owner,
+                "status": "queued",
+                "progress": 0,
+                "message": "Waiting for a free worker...",
+                "result": None,
+                "error": None,
+                "created": time.time(),
+                "started": None,
+                "finished": None,
+                "version": 0,  # Bumped on every change, lets SSE clients wait for news
+            }
+
+        self._pools[queue_name].submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["version"] += 1
+            self._cond.notify_all()
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status="running", started=time.time(), message="Running...")
+
+        def report(percent, message=""):
+            self._update(job_id, progress=int(percent), message=message)
+
+        try:
+            result = fn(*args, report=report, **kwargs)
+            self._update(job_id, status="done", progress=100, message="Complete", result=result, finished=time.time())
+        except BaseException as e:
+            # Also SystemExit & co.: a job left "running" would never finish, notify or be pruned
+            print(f"[Jobs] Job {job_id[:8]} failed: {e!r}")
+            self._update(job_id, status="failed", message="Failed", error=str(e) or type(e).__name__, finished=time.time())
+        finally:
+            with self._cond:
+                queue_name = self._jobs[job_id]["queue"] if job_id in self._jobs else None
+                if queue_name:
+                    self._pending[queue_name] -= 1
+
+    def _prune(self):
+        """Drops finished jobs older than keep_seconds. Caller holds _cond."""
+        cutoff = time.time() - self.keep_seconds
+        stale = [jid for jid, j in self._jobs.items() if j["finished"] and j["finished"] < cutoff]
+        for jid in stale:
+            del self._jobs[jid]
+
+    def get(self, job_id, owner=None):
+        """Public view of a job, or None if unknown (or owned by someone else)."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or (owner is not None and job["owner"] != owner):
+                return None
+            view = {k: v for k, v in job.items() if k != "owner"}
+            if job["status"] == "queued":
+                view["position"] = sum(
+                    1 for j in self._jobs.values()
+                    if j["queue"] == job["queue"] and j["status"] == "queued" and j["created"] <= job["created"]
+                )
+            return view
+
+    def wait_for_change(self, job_id, seen_version, timeout=15.0):
+        """Blocks until the job's version moves past seen_version (or timeout)."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: job_id not in self._jobs or self._jobs[job_id]["version"] > seen_version,
+                timeout=timeout,
+            )
+
+    def stats(self):
+        with self._cond:
+            counts = {}
+            for j in self._jobs.values():
+                counts.setdefault(j["queue"], {}).setdefault(j["status"], 0)
+                counts[j["queue"]][j["status"]] += 1
+            return {"workers": self.workers, "pending": dict(self._pending), "jobs": counts}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+# --- Test Block ---
+if __name__ == "__main__":
+    jobs = JobQueue(workers={"slow": 1}, max_pending=4)
+
+    def fake_transcribe(seconds, report=None):
+        for i in range(1, 5):
+            time.sleep(seconds / 4)
+            report(i * 25, f"Chunk {i}/4")
+        return "...checking price of Basmati rice..."
+
+    ids = [jobs.submit("slow", fake_transcribe, 0.4) for _ in range(2)]
+    print("Submitted:", [jobs.get(j)["status"] for j in ids])
+
+    seen = -1
+    while jobs.get(ids[-1])["status"] not in ("done", "failed"):
+        jobs.wait_for_change(ids[-1], seen, timeout=1.0)
+        job = jobs.get(ids[-1])
+        seen = job["version"]
+        print(f"  {job['status']:<8}{job['progress']:>4}%  {job['message']}")
+    print("Result:", jobs.get(ids[-1])["result"])
+    print(jobs.stats())
+    jobs.shutdown()
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+
+def grown_capacity(needed, capacity, minimum=256):
+    """Rows to allocate so appends stay amortized O(1): at least double, at least 'minimum'."""
+    return max(needed, capacity * 2, minimum)
+
+def grow_npy(path, current, used, capacity, dtype, row_shape=()):
+    """
+    Replaces the .npy at path with one of 'capacity' rows, keeping the first
+    'used' rows of 'current' (its memmap, or None). The new file is written
+    next to it and swapped in, so a crash never leaves a half-copied array.
+    Callers drop their old memmap and re-open path afterwards.
+    """
+    tmp = path + ".tmp"
+    grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(capacity,) + tuple(row_shape))
+    if used:
+        grown[:used] = current[:used]
+    grown.flush()
+    del grown
+    os.replace(tmp, path)
+
+# --- Test Block ---
+if __name__ == "__main__":
+    path = "memmap_demo.npy"
+    rows = None
+    for step in range(3):
+        used = 0 if rows is None else rows.shape[0]
+        grow_npy(path, rows, used, grown_capacity(used + 1, used, minimum=4), np.float32, (2,))
+        rows = np.load(path, mmap_mode="r+")
+        rows[used:] = step
+        print(f"Capacity {rows.shape[0]}: {rows[:, 0].tolist()}")
+    del rows
+    os.remove(path)
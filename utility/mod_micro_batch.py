@@ -0,0 +1,117 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name="Batcher"):
+        """
+        Collects items submitted from many threads and runs them through
+        batch_fn(list_of_items) -> list_of_results in one call.
+
+        A batch is flushed as soon as it holds max_batch_size items, or
+        max_wait_ms after its first item arrived, whichever comes first.
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._submit_lock = threading.Lock()  # No item slips in after close() has drained the queue
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+        # Stats
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Queues one item. Returns a Future resolving to its result."""
+        future = Future()
+        with self._submit_lock:
+            if self._stop.is_set():
+                raise RuntimeError(f"[{self.name}] Batcher is closed.")
+            self._queue.put((item, future))
+        return future
+
+    def run(self, item, timeout=None):
+        """Blocking helper: submit and wait for the result."""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until full or the wait expires."""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            # Skip requests whose callers already gave up
+            batch = [(item, fut) for item, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                print(f"[{self.name}] Batch of {len(items)} failed: {e}")
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        """Stops the worker. Items still queued fail at once instead of waiting out their timeout."""
+        with self._submit_lock:
+            self._stop.set()
+        self._worker.join(timeout=1.0)
+        while True:
+            try:
+                _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(RuntimeError(f"[{self.name}] Batcher closed before this item ran."))
+
+# --- Test Block ---
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+
+    def slow_square(xs):
+        time.sleep(0.02)  # Fixed cost per call, like a model forward pass
+        return [x * x for x in xs]
+
+    batcher = MicroBatcher(slow_square, max_batch_size=8, max_wait_ms=5)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        out = list(pool.map(batcher.run, range(64)))
+    print(f"Results OK: {out == [x * x for x in range(64)]}")
+    print(batcher.stats())
+    batcher.close()
@@ -0,0 +1,179 @@
+import os
+import sys
+import json
+import time
+import torch
+import torch.nn as nn
+
+from utility.mod_model_hub import current_rss_mb
+from utility.mod_thread_budget import budget
+
+EXPORT_DIR = "models/export"
+RUNTIMES = ("eager", "int8", "torchscript", "onnx")
+
+def artifact_path(name, runtime, export_dir=EXPORT_DIR):
+    """e.g. models/export/tractor_net.int8.pt"""
+    ext = ".onnx" if runtime == "onnx" else ".pt"
+    return os.path.join(export_dir, f"{name}.{runtime}{ext}")
+
+def weights_tag(path):
+    """Identifies the weights an artifact was built from: the file's mtime, or 'mock' (random init)."""
+    return str(int(os.path.getmtime(path))) if path and os.path.exists(path) else "mock"
+
+def _source_path(path):
+    return path + ".source.json"
+
+def record_source(path, weights_path):
+    """Notes which weights file (and which version of it) the artifact at path was built from."""
+    with open(_source_path(path), "w") as f:
+        json.dump({"weights": weights_path, "tag": weights_tag(weights_path)}, f)
+
+def export_model(model, example_input, path, runtime):
+    """
+    Writes a CPU inference artifact for an eager fp32 module.
+    int8        -> Linear layers dynamically quantized to int8, then TorchScript
+    torchscript -> traced + frozen fp32 graph
+    onnx        -> ONNX graph with a dynamic batch axis (needs onnxruntime to load)
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    model = model.eval()
+
+    if runtime == "onnx":
+        torch.onnx.export(
+            model, example_input, path,
+            input_names=["input"], output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+        return path
+
+    if runtime == "int8":
+        # Dynamic quantization only touches Linear layers (weights stored as int8,
+        # activations quantized on the fly). No calibration data needed.
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    elif runtime != "torchscript":
+        raise ValueError(f"Unknown runtime '{runtime}'. Use one of {RUNTIMES[1:]}.")
+
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input)
+    if runtime == "torchscript":
+        traced = torch.jit.freeze(traced)
+    traced.save(path)
+    return path
+
+class OnnxModule:
+    """Minimal callable wrapper so an ONNX session looks like a torch module."""
+    def __init__(self, path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(path, sess_options=budget.onnx_options(), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        out = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})[0]
+        return torch.from_numpy(out)
+
+    def eval(self):
+        return self
+
+def load_exported(name, runtime, export_dir=EXPORT_DIR, weights_path=None):
+    """
+    Loads a previously exported artifact. Returns None (so callers can fall
+    back to the eager model) if the artifact or its runtime is missing.
+    weights_path: the eager weights file the artifact is built from (e.g.
+    tractor_net.pth). If it changed since the build (retraining), the stale
+    artifact is refused as well.
+    """
+    if runtime == "eager":
+        return None
+    path = artifact_path(name, runtime, export_dir)
+    if not os.path.exists(path):
+        print(f"[Export] Warning: '{path}' not found. Run 'python -m utility.mod_model_export build'. Using eager model.")
+        return None
+    if weights_path is not None:
+        try:
+            with open(_source_path(path)) as f:
+                built_from = json.load(f)["tag"]
+        except (OSError, ValueError, KeyError):
+            built_from = None
+        if built_from != weights_tag(weights_path):
+            print(f"[Export] Warning: '{path}' was not built from the current '{weights_path}'. "
+                  f"Run 'python -m utility.mod_model_export build'. Using eager model.")
+            return None
+    try:
+        if runtime == "onnx":
+            return OnnxModule(path)
+        model = torch.jit.load(path, map_location="cpu")
+        model.eval()
+        return model
+    except (ImportError, RuntimeError) as e:
+        print(f"[Export] Could not load '{path}': {e}. Using eager model.")
+        return None
+
+# --- Build & Benchmark ---
+
+def _eager_targets():
+    """(artifact name, eager module, example input, weights file or None) for every CNN we ship."""
+    from diagnostic.mod_machinery_hear import TractorDoctor
+    from agri.mod_crop_doctor import CropDoctor
+
+    # Fixed seed so build and bench see the same weights even in Mock Mode (random init)
+    torch.manual_seed(0)
+    targets = [("tractor_net", TractorDoctor(runtime="eager").model, torch.randn(1, 1, 40, 80), "tractor_net.pth")]
+    for optimized, arch in ((True, "mobilenet_v3"), (False, "resnet50")):
+        doc = CropDoctor(use_optimized_model=optimized, runtime="eager")
+        targets.append((f"crop_doctor_{arch}", doc.model, torch.randn(1, 3, 224, 224), None))  # torchvision weights
+    return targets
+
+def build(runtimes=("int8", "torchscript"), export_dir=EXPORT_DIR):
+    for name, model, example, weights_path in _eager_targets():
+        for runtime in runtimes:
+            path = export_model(model, example, artifact_path(name, runtime, export_dir), runtime)
+            if weights_path is not None:
+                record_source(path, weights_path)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"[Export] {name} -> {path} ({size_mb:.1f} MB)")
+
+def benchmark(runtimes=("int8", "torchscript"), runs=30, samples=32, export_dir=EXPORT_DIR):
+    """
+    Compares each artifact with its eager model: median batch-1 latency,
+    RSS growth on load, and top-1 agreement over random inputs.
+    """
+    for name, eager, example, weights_path in _eager_targets():
+        inputs = torch.randn(samples, *example.shape[1:])
+        with torch.no_grad():
+            eager_top1 = eager(inputs).argmax(dim=1)
+
+        candidates = [("eager", eager, 0.0)]
+        for runtime in runtimes:
+            rss_before = current_rss_mb()
+            model = load_exported(name, runtime, export_dir, weights_path)
+            if model is not None:
+                candidates.append((runtime, model, max(current_rss_mb() - rss_before, 0.0)))
+
+        print(f"\n=== {name} ===")
+        print(f"{'runtime':<12}{'median ms':>10}{'speedup':>9}{'load MB':>9}{'top-1 agree':>13}")
+        base_ms = None
+        for runtime, model, load_mb in candidates:
+            with torch.no_grad():
+                for _ in range(3):  # Warm-up (TorchScript optimizes on first calls)
+                    model(example)
+                times = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    model(example)
+                    times.append((time.perf_counter() - start) * 1000)
+                agree = (model(inputs).argmax(dim=1) == eager_top1).float().mean().item()
+            ms = sorted(times)[len(times) // 2]
+            base_ms = base_ms or ms
+            print(f"{runtime:<12}{ms:>10.2f}{base_ms / ms:>8.2f}x{load_mb:>9.1f}{agree * 100:>12.1f}%")
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m utility.mod_model_export build [int8 torchscript onnx]
+    # python -m utility.mod_model_export bench [int8 torchscript onnx]
+    command = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    chosen = tuple(sys.argv[2:]) or ("int8", "torchscript")
+    if command == "build":
+        build(chosen)
+    else:
+        benchmark(chosen)
@@ -0,0 +1,165 @@
+import os
+import gc
+import time
+import threading
+from collections import OrderedDict
+
+def current_rss_mb():
+    """Resident memory of this process in MB (0.0 if it can't be read)."""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        # Linux fallback: 2nd field of statm is resident pages
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+class ModelHub:
+    def __init__(self, ram_budget_mb=None):
+        """
+        Process-wide registry of heavy engines (Whisper, Llama, YOLO...).
+        Each engine is built lazily on first use, shared by every request
+        in this worker, and evicted least-recently-used first when the
+        total RAM they take exceeds the budget.
+        """
+        if ram_budget_mb is None:
+            ram_budget_mb = float(os.environ.get("KARYA_MODEL_RAM_MB", 3072))
+        self.ram_budget_mb = ram_budget_mb
+
+        self._factories = {}
+        self._models = OrderedDict()  # name -> entry, oldest use first
+        self._lock = threading.Lock()
+        self._load_locks = {}         # name -> lock, so a model is only built once
+        self.evictions = 0
+
+    def register(self, name, factory):
+        """Registers a zero-argument callable that builds the engine."""
+        with self._lock:
+            self._factories[name] = factory
+            self._load_locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """
+        Returns the shared engine, loading it on first use.
+        Any exception raised by the factory is passed to the caller
+        (so the app's 'TRY REAL -> FALLBACK' logic still works).
+        """
+        with self._lock:
+            entry = self._models.get(name)
+            if entry:
+                self._models.move_to_end(name)
+                entry["hits"] += 1
+                entry["last_used"] = time.time()
+                return entry["model"]
+            if name not in self._factories:
+                raise KeyError(f"Model '{name}' is not registered.")
+            load_lock = self._load_locks[name]
+
+        # Build outside the registry lock so other models stay available.
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry:  # Another thread finished loading it first
+                    self._models.move_to_end(name)
+                    entry["hits"] += 1
+                    entry["last_used"] = time.time()
+                    return entry["model"]
+
+            print(f"[Hub] Loading '{name}'...")
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            model = self._factories[name]()
+            load_s = time.perf_counter() - start
+            mem_mb = max(current_rss_mb() - rss_before, 0.0)
+            print(f"[Hub] '{name}' ready in {load_s:.2f}s (+{mem_mb:.0f} MB).")
+
+            with self._lock:
+                self._models[name] = {
+                    "model": model,
+                    "load_seconds": load_s,
+                    "memory_mb": mem_mb,
+                    "loaded_at": time.time(),
+                    "last_used": time.time(),
+                    "hits": 1,
+                }
+                self._enforce_budget(keep=name)
+            return model
+
+    def _enforce_budget(self, keep):
+        """Drops least-recently-used models until we are under budget. Caller holds _lock."""
+        dropped = False
+        while self._used_mb() > self.ram_budget_mb and len(self._models) > 1:
+            victim = next(iter(self._models))
+            if victim == keep:
+                break
+            entry = self._models.pop(victim)
+            self._release(entry["model"])
+            self.evictions += 1
+            dropped = True
+            print(f"[Hub] RAM budget exceeded. Evicted '{victim}' ({entry['memory_mb']:.0f} MB).")
+        if dropped:
+            gc.collect()
+
+    def _used_mb(self):
+        return sum(e["memory_mb"] for e in self._models.values())
+
+    def evict(self, name):
+        """Unloads a model explicitly. Returns True if it was loaded."""
+        with self._lock:
+            entry = self._models.pop(name, None)
+        if entry is None:
+            return False
+        self._release(entry["model"])
+        gc.collect()
+        return True
+
+    @staticmethod
+    def _release(model):
+        # Models that own threads (e.g. the LLM scheduler) stop them here
+        close = getattr(model, "close", None)
+        if callable(close):
+            close()
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def stats(self):
+        """Snapshot of what is loaded, for the /models/stats endpoint."""
+        with self._lock:
+            models = {
+                name: {
+                    "load_seconds": round(e["load_seconds"], 3),
+                    "memory_mb": round(e["memory_mb"], 1),
+                    "hits": e["hits"],
+                    "idle_seconds": round(time.time() - e["last_used"], 1),
+                }
+                for name, e in self._models.items()
+            }
+            return {
+                "ram_budget_mb": self.ram_budget_mb,
+                "used_mb": round(self._used_mb(), 1),
+                "process_rss_mb": round(current_rss_mb(), 1),
+                "registered": sorted(self._factories),
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+# One hub per worker process
+hub = ModelHub()
+
+# --- Test Block ---
+if __name__ == "__main__":
+    demo = ModelHub(ram_budget_mb=60)
+    demo.register("small", lambda: bytearray(20 * 1024 * 1024))
+    demo.register("big", lambda: bytearray(50 * 1024 * 1024))
+
+    demo.get("small")
+    demo.get("small")  # Second call is served from memory
+    demo.get("big")    # Pushes us over budget -> 'small' is evicted
+    print(demo.stats())
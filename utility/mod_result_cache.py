@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+class ResultCache:
+    def __init__(self, db_path="result_cache.db", max_bytes=64 * 1024 * 1024):
+        """
+        Content-addressed cache for tool outputs.
+        Key = sha256(file bytes) + tool + model version, so a re-uploaded photo
+        or recording is answered without touching the model, and a new model
+        version never serves stale results. Bounded by total stored bytes,
+        least-recently-used entries are evicted first.
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._create_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _create_table(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                tool TEXT,
+                value TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_results_access ON results (last_access)')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        """sha256 of the file contents (the filename doesn't matter)."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, file_path, tool, model_version):
+        return f"{self.hash_file(file_path)}:{tool}:{model_version}"
+
+    def get(self, key):
+        """Returns the cached value, or None on a miss."""
+        conn = self._connect()
+        row = conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row:
+            conn.execute('UPDATE results SET last_access = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            conn.commit()
+        conn.close()
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        """Stores any JSON-serializable value (tuples come back as lists)."""
+        payload = json.dumps(value)
+        tool = key.split(":")[1] if ":" in key else ""
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute('''
+            INSERT OR REPLACE INTO results (key, tool, value, size, created, last_access, hits)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (key, tool, payload, len(payload), now, now))
+        self._evict(conn)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, conn):
+        """Deletes least-recently-used rows until the total size fits max_bytes."""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute('SELECT key, size FROM results ORDER BY last_access ASC').fetchall()
+        victims = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM results WHERE key = ?', victims)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def get_or_compute(self, file_path, tool, model_version, compute):
+        """
+        Cache-aside helper. compute() only runs on a miss, and its result is
+        stored only if it returns normally (so fallbacks are never cached).
+        """
+        key = self.make_key(file_path, tool, model_version)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM results')
+        conn.commit()
+        conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+        conn.close()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+# --- Test Block ---
+if __name__ == "__main__":
+    cache = ResultCache(db_path="test_result_cache.db", max_bytes=2048)
+    with open("test_upload.bin", "wb") as f:
+        f.write(os.urandom(1024))
+
+    def slow_model():
+        time.sleep(0.5)
+        return ["Tomato Early Blight", 0.91]
+
+    for attempt in range(2):
+        start = time.perf_counter()
+        out = cache.get_or_compute("test_upload.bin", "crop_doctor", "mobilenet_v3/eager", slow_model)
+        print(f"Attempt {attempt + 1}: {out} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(cache.stats())
+
+    os.remove("test_upload.bin")
+    os.remove("test_result_cache.db")
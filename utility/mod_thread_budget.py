@@ -0,0 +1,223 @@
+import os
+import re
+import sys
+import time
+import threading
+
+# Thread pools we size. Whisper, CropDoctor, AudioCNN and YOLO all run on
+# torch's process-wide pool, so they share the "torch" entry.
+ENGINES = ("llama", "torch", "onnx", "opencv")
+
+# The JobQueue answers a chat (llama.cpp) while a vision/audio job runs, so
+# those two sides split a worker's cores. Torch, ONNX and OpenCV work inside
+# the same vision/audio jobs and take turns, so they share one side.
+ENGINE_SIDES = {"llama": "chat", "torch": "vision", "onnx": "vision", "opencv": "vision"}
+
+# Native libraries read these once, when they are first loaded
+BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+def available_cores():
+    """CPUs this process may run on: affinity mask, capped by a cgroup CPU quota (containers)."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cores = min(cores, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cores)
+
+def worker_count():
+    """Web worker processes sharing this machine: WEB_CONCURRENCY, else gunicorn's --workers, else 1."""
+    if os.environ.get("WEB_CONCURRENCY", "").isdigit():
+        return max(1, int(os.environ["WEB_CONCURRENCY"]))
+    match = re.search(r"(?:--workers[= ]|-w ?)(\d+)", os.environ.get("GUNICORN_CMD_ARGS", ""))
+    return max(1, int(match.group(1))) if match else 1
+
+class ThreadBudget:
+    def __init__(self, cores=None, workers=None, overrides=None, concurrent=None):
+        """
+        Splits the machine's cores between web workers, so N gunicorn workers
+        x (torch + llama.cpp + OpenCV pools) don't run far more threads than
+        there are cores. Each worker gets cores // workers threads, divided
+        between the chat side (llama) and the vision/audio side (torch, ONNX,
+        OpenCV), which the JobQueue runs at the same time.
+
+        concurrent: False when a process runs one engine at a time (the CLI),
+        so every engine may use the whole share. Also read from
+        KARYA_CONCURRENT_ENGINES=0/1; defaults to True.
+        overrides: {"llama": 2, ...}. Also read from KARYA_THREADS_<ENGINE>
+        (e.g. KARYA_THREADS_LLAMA=3); the argument wins over the environment.
+        """
+        self.cores = cores or available_cores()
+        self.workers = workers or worker_count()
+        self.per_worker = max(1, self.cores // self.workers)
+        if concurrent is None:
+            concurrent = os.environ.get("KARYA_CONCURRENT_ENGINES", "1") != "0"
+        self.concurrent = concurrent
+        if concurrent:
+            # Generation is memory-bound and gains less per thread, so an odd core goes to vision
+            chat = max(1, self.per_worker // 2)
+            self.sides = {"chat": chat, "vision": max(1, self.per_worker - chat)}
+        else:
+            self.sides = {"chat": self.per_worker, "vision": self.per_worker}
+        self.overrides = {}
+        for engine in ENGINES:
+            value = os.environ.get(f"KARYA_THREADS_{engine.upper()}", "")
+            if value.isdigit() and int(value) > 0:
+                self.overrides[engine] = int(value)
+        self.overrides.update(overrides or {})
+        self.applied = {}
+        self._lock = threading.Lock()
+
+    def threads(self, engine):
+        return self.overrides.get(engine, self.sides[ENGINE_SIDES[engine]])
+
+    def apply_env(self):
+        """
+        Sets OMP/BLAS thread variables (unless already set). Only libraries
+        loaded afterwards see them, so call this before numpy/torch are imported.
+        """
+        for var in BLAS_ENV_VARS:
+            os.environ.setdefault(var, str(self.threads("torch")))
+        self.applied["env"] = int(os.environ["OMP_NUM_THREADS"])
+
+    def apply_torch(self):
+        """Sizes torch's intra-op pool; inter-op is kept at 1 (we never run parallel graph branches)."""
+        import torch
+        with self._lock:
+            n = self.threads("torch")
+            if self.applied.get("torch") == n:
+                return n
+            torch.set_num_threads(n)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # Only allowed before torch's first parallel op
+            self.applied["torch"] = n
+            return n
+
+    def apply_opencv(self):
+        import cv2
+        with self._lock:
+            n = self.threads("opencv")
+            if self.applied.get("opencv") != n:
+                cv2.setNumThreads(n)
+                self.applied["opencv"] = n
+            return n
+
+    def onnx_options(self):
+        """SessionOptions for onnxruntime with the 'onnx' thread count."""
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads("onnx")
+        options.inter_op_num_threads = 1
+        return options
+
+    def stats(self):
+        return {
+            "cores": self.cores,
+            "workers": self.workers,
+            "per_worker": self.per_worker,
+            "concurrent": self.concurrent,
+            "threads": {engine: self.threads(engine) for engine in ENGINES},
+            "overrides": dict(self.overrides),
+            "applied": dict(self.applied),
+        }
+
+# Process-wide instance
+budget = ThreadBudget()
+
+# --- Benchmark ---
+
+def _mixed_load(seconds, llama_threads, torch_threads, model_path, engines="both"):
+    """
+    Runs TinyLlama generation and CropDoctor-sized CNN inference at the same
+    time (as one web worker would) and returns their throughputs.
+    engines: "both", or "vision" / "chat" alone.
+    """
+    import torch
+    from torchvision import models
+    from llama_cpp import Llama
+
+    torch.set_num_threads(torch_threads)
+    cnn = models.mobilenet_v3_large(weights=None).eval()
+    llm = Llama(model_path=model_path, n_ctx=512, n_threads=llama_threads, verbose=False)
+    stop = time.perf_counter() + seconds
+    counts = {"images": 0, "tokens": 0}
+
+    def vision():
+        x = torch.randn(1, 3, 224, 224)
+        with torch.no_grad():
+            while time.perf_counter() < stop:
+                cnn(x)
+                counts["images"] += 1
+
+    def chat():
+        while time.perf_counter() < stop:
+            for _ in llm("Q: How do I store onions?\nA:", max_tokens=32, stream=True):
+                counts["tokens"] += 1
+                if time.perf_counter() >= stop:
+                    break
+
+    threads = [threading.Thread(target=fn) for side, fn in (("vision", vision), ("chat", chat)) if engines in ("both", side)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"images_per_sec": round(counts["images"] / seconds, 2), "tokens_per_sec": round(counts["tokens"] / seconds, 2)}
+
+def _run_workers(workers, seconds, llama_threads, torch_threads, model_path, engines="both"):
+    import json
+    import subprocess
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "utility.mod_thread_budget", "_worker",
+                          str(seconds), str(llama_threads), str(torch_threads), model_path, engines],
+                         stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    results = [json.loads(p.communicate()[0].strip().splitlines()[-1]) for p in procs]
+    return {k: round(sum(r[k] for r in results), 2) for k in results[0]}
+
+def benchmark(workers=None, seconds=20, model_path="models/tinyllama-1.1b-chat-v1.0.Q4_K_M.gguf"):
+    """
+    Starts 'workers' processes that each run the mixed load, once with the
+    library defaults (torch = all cores, llama n_threads=4) and once with the
+    budget, and prints the aggregate throughput of both.
+    Images/s and tokens/s trade against each other, so each run is also
+    scored against either engine running alone on the whole machine:
+    efficiency = images/s / solo images/s + tokens/s / solo tokens/s
+    (1.0 = the cores are fully used, lower = lost to oversubscription).
+    """
+    workers = workers or max(2, worker_count())
+    cores = available_cores()
+    share = ThreadBudget(cores=cores, workers=workers, concurrent=True)
+    configs = {
+        "defaults": (4, cores),
+        "budget": (share.threads("llama"), share.threads("torch")),
+    }
+    solo_images = _run_workers(1, seconds, cores, cores, model_path, "vision")["images_per_sec"]
+    solo_tokens = _run_workers(1, seconds, cores, cores, model_path, "chat")["tokens_per_sec"]
+    print(f"[Threads] {cores} cores, {workers} concurrent workers. "
+          f"Alone on the machine: {solo_images} images/s, {solo_tokens} tokens/s")
+    for name, (llama_threads, torch_threads) in configs.items():
+        total = _run_workers(workers, seconds, llama_threads, torch_threads, model_path)
+        efficiency = total["images_per_sec"] / solo_images + total["tokens_per_sec"] / solo_tokens
+        print(f"[Threads] {name:<8} llama={llama_threads} torch={torch_threads} "
+              f"({workers * (llama_threads + torch_threads)} threads on {cores} cores): "
+              f"{total['images_per_sec']} images/s, {total['tokens_per_sec']} tokens/s (all workers), "
+              f"efficiency {efficiency:.2f}")
+
+# --- Test Block ---
+if __name__ == "__main__":
+    # python -m utility.mod_thread_budget [workers]
+    if len(sys.argv) > 1 and sys.argv[1] == "_worker":
+        import json
+        print(json.dumps(_mixed_load(float(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4]), sys.argv[5], sys.argv[6])))
+    else:
+        print(budget.stats())
+        benchmark(workers=int(sys.argv[1]) if len(sys.argv) > 1 else None)